@@ -0,0 +1,102 @@
+# throughput benchmark for the streaming anomaly detector, plus a drift detection check
+#
+# usage: python benchmarks/bench_anomaly_detector.py [--devices 1000] [--readings 200000]
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stream_consumer'))
+
+from anomaly_detector import detect_anomalies, reset_state, update_metric  # noqa: E402
+
+# Publisher default: 4 rooms every 20 seconds
+PUBLISHER_RATE = 4 / 20
+
+
+def make_readings(n_devices, n_readings):
+    """Pre-generate readings so only the detector is timed."""
+    rng = random.Random(42)
+    timestamp = datetime.now().isoformat()
+    readings = []
+    for i in range(n_readings):
+        device = i % n_devices
+        readings.append({
+            "device_id": f"sensor_{device}",
+            "room": f"room_{device}",
+            "timestamp": timestamp,
+            "temperature": round(rng.uniform(15.0, 30.0), 2),
+            "humidity": round(rng.uniform(30.0, 70.0), 2),
+            "co2": round(rng.uniform(400, 1000), 2),
+        })
+    return readings
+
+
+# Slow drifts inside the alert thresholds: sigma=0.3 noise plus a ramp per reading
+DRIFT_SCENARIOS = [0.0, 0.002, 0.01, 0.03]
+DRIFT_READINGS = 2700
+
+
+def drift_alerts(slope, seed=42, sigma=0.3):
+    """Feed one ramping metric through the detector; returns [(index, anomaly)]."""
+    reset_state()
+    rng = random.Random(seed)
+    alerts = []
+    for i in range(DRIFT_READINGS):
+        anomaly = update_metric("sensor_ramp", "temperature", 20.0 + slope * i + rng.gauss(0, sigma))
+        if anomaly:
+            alerts.append((i, anomaly))
+    return alerts
+
+
+def check_drift():
+    """A ramp must raise one Drift alert (not flap); pure noise must raise none."""
+    ok = True
+    for slope in DRIFT_SCENARIOS:
+        alerts = drift_alerts(slope)
+        drifts = [i for i, anomaly in alerts if anomaly == "Drift"]
+        passed = len(drifts) == (1 if slope else 0)
+        ok = ok and passed
+        first = f"first at reading {drifts[0]}" if drifts else "none"
+        print(f"{'✅' if passed else '❌'} ramp {slope:.3f}/reading: {len(drifts)} drift alert(s), "
+              f"{len(alerts)} total ({first})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detect_anomalies throughput")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--ingest-rate", type=float, default=PUBLISHER_RATE,
+                        help="readings/s the consumer has to sustain")
+    args = parser.parse_args()
+
+    readings = make_readings(args.devices, args.readings)
+    reset_state()
+
+    alerts = 0
+    start = time.perf_counter()
+    for reading in readings:
+        alerts += len(detect_anomalies(reading))
+    elapsed = time.perf_counter() - start
+
+    rate = args.readings / elapsed
+    print(f"📊 {args.readings} readings over {args.devices} devices in {elapsed:.3f}s")
+    print(f"⚡ {rate:,.0f} readings/s ({elapsed / args.readings * 1e6:.2f} µs/reading), {alerts} anomalies")
+    print(f"🎯 required ingest rate {args.ingest_rate:,.2f} readings/s -> headroom {rate / args.ingest_rate:,.0f}x")
+
+    if rate < args.ingest_rate:
+        print("❌ Detector cannot keep up with the ingest rate")
+        sys.exit(1)
+    print("✅ Detector keeps up with the ingest rate")
+
+    if not check_drift():
+        print("❌ Drift detection missed or repeated a slow ramp")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
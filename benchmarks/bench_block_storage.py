@@ -0,0 +1,82 @@
+# size and scan time of the compressed cold tier vs the raw sensor_data table
+#
+# Works on a copy of the database: every row is compacted into sensor_blocks, then the
+# same range is scanned from the raw copy (read_sql_query + parsing) and from the blocks.
+#
+# usage: python benchmarks/bench_block_storage.py [--db storage/sensor_data.db]
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'stream_consumer'))
+
+import pandas as pd  # noqa: E402
+
+import block_storage  # noqa: E402
+from sqlite_writer import DB_PATH, ensure_db  # noqa: E402
+
+
+def raw_scan(db_path):
+    """Full-range scan of the raw rows, as the dashboard did before the cold tier."""
+    with sqlite3.connect(db_path) as conn:
+        df = pd.read_sql_query('''
+            SELECT s.timestamp, d.device_id, d.room, s.temperature, s.humidity, s.co2
+            FROM sensor_data s JOIN devices d ON d.device_key = s.device_key
+        ''', conn)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
+    return len(df)
+
+
+def block_scan(db_path):
+    arrays = block_storage.read_blocks(datetime(1970, 1, 1), datetime(9999, 1, 1), db_path=db_path)
+    return len(arrays['timestamp'])
+
+
+def best_of(func, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold block storage size and scan time")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_db, cold_db = os.path.join(tmp, 'raw.db'), os.path.join(tmp, 'cold.db')
+        shutil.copy(args.db, raw_db)
+        ensure_db(raw_db)
+        shutil.copy(raw_db, cold_db)
+
+        with sqlite3.connect(raw_db) as conn:
+            raw_bytes = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = 'sensor_data'").fetchone()[0]
+        block_storage.compact_closed_blocks(hot_hours=-24 * 365 * 100, db_path=cold_db)
+        with sqlite3.connect(cold_db) as conn:
+            n_blocks, payload_bytes = conn.execute(
+                "SELECT COUNT(*), SUM(LENGTH(payload)) FROM sensor_blocks").fetchone()
+
+        raw_time, raw_rows = best_of(raw_scan, raw_db)
+        cold_time, cold_rows = best_of(block_scan, cold_db)
+
+    print(f"📦 {raw_rows} rows: raw table {raw_bytes / 1e6:.2f} MB, "
+          f"{n_blocks} blocks {payload_bytes / 1e6:.2f} MB ({raw_bytes / max(payload_bytes, 1):.1f}x smaller)")
+    print(f"🔎 raw scan   {raw_time * 1000:8.1f} ms (read_sql_query + timestamp parsing)")
+    print(f"🔎 block scan {cold_time * 1000:8.1f} ms (decode every block)")
+    if cold_rows != raw_rows:
+        print(f"❌ row counts differ: raw {raw_rows}, blocks {cold_rows}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
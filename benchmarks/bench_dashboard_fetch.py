@@ -0,0 +1,90 @@
+# compare the dashboard's typed NumPy fetch path with pd.read_sql_query
+#
+# usage: python benchmarks/bench_dashboard_fetch.py [--db storage/sensor_data.db] [--days 7]
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'stream_consumer'))
+sys.path.insert(0, os.path.join(ROOT, 'dashboard'))
+
+import pandas as pd  # noqa: E402
+
+from block_storage import read_blocks  # noqa: E402
+from fast_fetch import fetch_sensor_arrays, build_sensor_frame  # noqa: E402
+from sqlite_writer import DB_PATH, ensure_db  # noqa: E402
+
+
+def read_sql_path(db_path, start_time, end_time):
+    """The previous load_sensor_data: row tuples, text timestamps parsed by pandas, cold blocks concatenated."""
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query('''
+        SELECT s.timestamp, d.device_id, d.room, s.temperature, s.humidity, s.co2
+        FROM sensor_data s JOIN devices d ON d.device_key = s.device_key
+        WHERE datetime(s.timestamp) >= datetime(?) AND datetime(s.timestamp) <= datetime(?)
+    ''', conn, params=[start_time.isoformat(), end_time.isoformat()])
+    devices = pd.read_sql_query("SELECT device_key, device_id, room FROM devices", conn).set_index('device_key')
+    conn.close()
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
+
+    # Older hours live in the compressed block tier
+    cold = pd.DataFrame(read_blocks(start_time, end_time, db_path=db_path))
+    if len(cold):
+        cold['timestamp'] = pd.to_datetime(cold['timestamp'], unit='ms')
+        cold = cold.join(devices, on='device_key').drop(columns='device_key')
+        df = pd.concat([cold[df.columns], df], ignore_index=True) if len(df) else cold[df.columns]
+    return df
+
+
+def fast_path(db_path, start_time, end_time):
+    return build_sensor_frame(fetch_sensor_arrays(db_path, start_time, end_time))
+
+
+def measure(name, loader, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        loader(*args)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    df = loader(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    frame_mb = df.memory_usage(deep=True).sum() / 1e6
+    print(f"{name:<16} {len(df):>8} rows  {best * 1000:8.1f} ms  frame {frame_mb:6.2f} MB  peak {peak / 1e6:6.2f} MB")
+    return best, frame_mb, peak, len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard data loading paths")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--end", default=datetime.now().isoformat(), help="window end (ISO timestamp)")
+    parser.add_argument("--days", type=float, default=7)
+    args = parser.parse_args()
+
+    end_time = datetime.fromisoformat(args.end)
+    start_time = end_time - timedelta(days=args.days)
+    ensure_db(args.db)   # both paths expect the devices table
+
+    old = measure("read_sql_query", read_sql_path, args.db, start_time, end_time)
+    new = measure("typed arrays", fast_path, args.db, start_time, end_time)
+    if old[3] != new[3]:
+        print(f"❌ row counts differ: read_sql_query {old[3]}, typed arrays {new[3]}")
+        sys.exit(1)
+    if not new[3]:
+        print("⏭️  no readings in the window, nothing to compare (see --end / --days)")
+        return
+    print(f"⚡ {old[0] / new[0]:.1f}x faster, {old[1] / new[1]:.1f}x smaller frame, "
+          f"{old[2] / new[2]:.1f}x lower peak allocation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# cold-start budgets for the consumer, simulator and dashboard entry points
+#
+# Each module is imported in a fresh interpreter with -X importtime; the cumulative
+# import time of the module itself is compared against its budget. Importing must also
+# be free of side effects: no database is created or touched, no broker is contacted.
+# Since tables are then created on first use, a bulk import into a fresh database
+# (with rollups) checks that lazy initialization still works end to end.
+#
+# usage: python benchmarks/bench_startup.py [--repeat 5]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORAGE_DIR = os.path.join(ROOT, 'storage')
+
+# (directory, module, budget in ms, packages that must not be imported at startup)
+STARTUP_BUDGETS = [
+    ('stream_consumer', 'sqlite_writer',    40,  []),
+    ('stream_consumer', 'sketch_rollups',   40,  []),
+    ('stream_consumer', 'anomaly_detector', 20,  []),
+    ('stream_consumer', 'subscriber',       150, ['numpy']),   # paho is most of this
+    ('data_simulator',  'publisher',        150, []),
+    ('dashboard',       'components',       2000, ['plotly', 'pyarrow']),
+]
+
+
+def import_time_ms(directory, module):
+    """Cumulative import time of `module` in a fresh interpreter, plus every module it loaded."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.join(ROOT, directory), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+
+    loaded, total_us = set(), None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        loaded.add(name.split('.')[0])
+        if name == module:
+            total_us = int(cumulative)
+    return total_us / 1000, loaded
+
+
+def first_use_import():
+    """Run backfill.py import on a small CSV into a fresh database; returns an error or None."""
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'readings.csv')
+        with open(csv_path, 'w') as file:
+            file.write('timestamp,device_id,room,temperature,humidity,co2\n')
+            for i in range(100):
+                file.write(f'2025-06-16T16:{i // 60:02d}:{i % 60:02d},sensor_kitchen,kitchen,22.5,41.0,{500 + i}\n')
+
+        result = subprocess.run(
+            [sys.executable, 'backfill.py', 'import', csv_path, '--db', os.path.join(tmp, 'fresh.db')],
+            cwd=os.path.join(ROOT, 'stream_consumer'), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return result.stderr.strip().splitlines()[-1]
+    return None
+
+
+def storage_snapshot():
+    """mtime of every file in storage/, to detect import-time database writes."""
+    if not os.path.isdir(STORAGE_DIR):
+        return {}
+    return {name: os.path.getmtime(os.path.join(STORAGE_DIR, name)) for name in os.listdir(STORAGE_DIR)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check entry point import times against budgets")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module (best is kept)")
+    args = parser.parse_args()
+
+    before = storage_snapshot()
+    failures = 0
+    for directory, module, budget, forbidden in STARTUP_BUDGETS:
+        try:
+            runs = [import_time_ms(directory, module) for _ in range(args.repeat)]
+        except ImportError as e:
+            print(f"⏭️  {directory}/{module:<18} skipped ({e})")
+            continue
+
+        best = min(ms for ms, _ in runs)
+        eager = sorted(set(forbidden) & runs[0][1])
+        ok = best <= budget and not eager
+        failures += not ok
+        note = f"  eagerly imports {', '.join(eager)}" if eager else ""
+        print(f"{'✅' if ok else '❌'} {directory}/{module:<18} {best:8.1f} ms  (budget {budget} ms){note}")
+
+    if storage_snapshot() != before:
+        print("❌ importing an entry point created or modified files in storage/")
+        failures += 1
+
+    error = first_use_import()
+    failures += error is not None
+    print(f"❌ first-use bulk import failed: {error}" if error else "✅ first-use bulk import into a fresh database")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
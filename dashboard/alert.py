@@ -3,6 +3,9 @@ import pandas as pd
 from datetime import datetime, timedelta
 import streamlit as st
 
+# Alert store shared with the stream consumer (threshold + anomaly alerts)
+ALERT_DB_PATH = "../storage/alert_log.db"
+
 def detect_alerts(df):
 
     ALERT_THRESHOLDS = {
@@ -36,18 +39,20 @@ def log_alerts_to_db(alert_df: pd.DataFrame):
     if alert_df.empty:
         return
 
-    conn = sqlite3.connect("alert_log.db")
+    conn = sqlite3.connect(ALERT_DB_PATH)
     existing_df = pd.read_sql_query("SELECT timestamp, room, alert_type, value FROM alert_log", conn)
 
-    # Convert timestamps
-    existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], errors='coerce')
-    alert_df['timestamp'] = pd.to_datetime(alert_df['timestamp'], errors='coerce')
+    # Convert timestamps (ISO8601: one parse for 'T' and ' ' separated rows alike)
+    existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], format='ISO8601', errors='coerce')
+    alert_df['timestamp'] = pd.to_datetime(alert_df['timestamp'], format='ISO8601', errors='coerce')
 
     # Deduplicate: remove alerts already in DB
     merged = alert_df.merge(existing_df, on=["timestamp", "room", "alert_type", "value"], how="left", indicator=True)
     new_alerts = merged[merged['_merge'] == 'left_only'].drop(columns=['_merge'])
 
     if not new_alerts.empty:
+        # Same text format as the consumer's alerts (to_sql would write a space instead of 'T')
+        new_alerts['timestamp'] = new_alerts['timestamp'].map(lambda ts: ts.isoformat())
         new_alerts.to_sql("alert_log", conn, if_exists="append", index=False)
 
     conn.close()
@@ -55,10 +60,10 @@ def log_alerts_to_db(alert_df: pd.DataFrame):
 
 def get_recent_alert_count(hours: int = 2) -> int:
     try:
-        conn = sqlite3.connect("alert_log.db")
+        conn = sqlite3.connect(ALERT_DB_PATH)
         df = pd.read_sql_query("SELECT timestamp FROM alert_log", conn)
         conn.close()
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', errors='coerce')
         recent = df[df['timestamp'] > datetime.now() - timedelta(hours=hours)]
         return len(recent)
     except Exception:
@@ -66,11 +71,11 @@ def get_recent_alert_count(hours: int = 2) -> int:
 
 def get_all_alerts():
     try:
-        conn = sqlite3.connect("alert_log.db")
+        conn = sqlite3.connect(ALERT_DB_PATH)
         df_alerts = pd.read_sql_query("SELECT * FROM alert_log ORDER BY timestamp DESC LIMIT 100", conn)
         conn.close()
 
-        df_alerts['timestamp'] = pd.to_datetime(df_alerts['timestamp'], errors='coerce')
+        df_alerts['timestamp'] = pd.to_datetime(df_alerts['timestamp'], format='ISO8601', errors='coerce')
 
         if df_alerts.empty:
             st.success("✅ No alerts recorded yet.")
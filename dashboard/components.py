@@ -1,13 +1,22 @@
 #import 
 import streamlit as st
 import uuid
-import plotly.express as px
 import pandas as pd
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from alert import detect_alerts, log_alerts_to_db
+from alert import detect_alerts, log_alerts_to_db, ALERT_DB_PATH
 import sqlite3
+import os
+import sys
+
+# Plotly is imported inside the chart functions: it is the heaviest import of the
+# dashboard and a new session should not wait for it before the first panel renders
+
+# Make the stream consumer's storage helpers importable from the dashboard
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stream_consumer'))
+from sketch_rollups import query_percentiles
+from export import cleanup_exports, export_range, parquet_available, EXPORT_DIR
+
+DOWNLOAD_LIMIT_MB = 20  # larger exports stay on disk: a download is held in server memory while offered
 
 # KPI card function 
 def kpi_card(label, value, color="#2ECC71"):
@@ -36,14 +45,102 @@ def kpi_card(label, value, color="#2ECC71"):
         </div>
     """, unsafe_allow_html=True)
 
+@st.cache_data(ttl=30)
+def load_percentiles(room, start_time, end_time):
+    """Merge the stored quantile sketches for the window (no raw rows are read)."""
+    return query_percentiles(start_time, end_time, rooms=room)
+
+def percentile_kpis(room, start_time, end_time, key_prefix):
+    """Optional row of p50/p95/p99 KPI cards backed by the sketch rollups."""
+    if not st.toggle("📐 Show percentile KPIs", key=f"{key_prefix}_pct_toggle"):
+        return
+
+    metric_labels = {"temperature": "🌡️ Temp (°C)", "humidity": "💧 Humidity (%)", "co2": "🏭 CO₂ (ppm)",
+                     "mood_score": "😌 Mood Score"}
+    metric = st.selectbox("Metric", options=list(metric_labels), format_func=metric_labels.get,
+                          key=f"{key_prefix}_pct_metric")
+
+    # Minute resolution keeps the cache key stable across reruns
+    percentiles = load_percentiles(room, start_time.replace(second=0, microsecond=0),
+                                   end_time.replace(second=0, microsecond=0))[metric]
+    colors = {0.5: "#2D9CDB", 0.95: "#9B51E0", 0.99: "#EB5757"}
+
+    for col, (q, value) in zip(st.columns(len(percentiles)), percentiles.items()):
+        with col:
+            kpi_card(f"{metric_labels[metric]} p{int(q * 100)}",
+                     "—" if value is None else f"{value:.2f}", colors.get(q, "#2ECC71"))
+
+    st.markdown("<div style='height: 20px;'></div>", unsafe_allow_html=True)
+
+def export_panel(room_labels, key_prefix="export"):
+    """Stream a (rooms, date range) selection to storage/exports and offer it for download."""
+    with st.expander("⬇️ Export sensor data (CSV / Parquet)"):
+        col1, col2, col3 = st.columns([3, 2, 1])
+        with col1:
+            rooms = st.multiselect("Rooms (empty = all)", options=list(room_labels),
+                                   format_func=room_labels.get, key=f"{key_prefix}_rooms")
+        with col2:
+            today = datetime.today().date()
+            dates = st.date_input("Date range", (today - timedelta(days=6), today), key=f"{key_prefix}_dates")
+        with col3:
+            formats = ['csv'] + (['parquet'] if parquet_available() else [])
+            fmt = st.selectbox("Format", options=formats, format_func=str.upper, key=f"{key_prefix}_format")
+
+        if len(dates) != 2:
+            st.info("Pick a start and an end date.")
+            return
+
+        if st.button("📦 Export", key=f"{key_prefix}_run"):
+            start_time = datetime.combine(dates[0], datetime.min.time())
+            end_time = datetime.combine(dates[1], datetime.max.time())
+            # One file per export: concurrent sessions never share or overwrite an output
+            room_part = "-".join(sorted(rooms)) if rooms else "all"
+            name = f"sensor_data_{dates[0]}_{dates[1]}_{room_part}_{uuid.uuid4().hex[:8]}.{fmt}"
+            path = os.path.join(EXPORT_DIR, name)
+            cleanup_exports()
+            with st.spinner("Exporting..."):
+                stats = export_range(path, start_time, end_time, rooms=rooms or None, fmt=fmt)
+            # Only the path and stats are kept across reruns, never the file contents
+            st.session_state[f"{key_prefix}_result"] = (path, stats)
+
+        result = st.session_state.get(f"{key_prefix}_result")
+        if not result or not os.path.exists(result[0]):
+            return
+
+        path, stats = result
+        size_mb = stats['bytes'] / 1e6
+        st.caption(f"✅ {stats['rows']:,} rows in {stats['seconds']:.2f}s "
+                   f"({stats['rows_per_second']:,.0f} rows/s, {size_mb:.1f} MB)")
+        if size_mb > DOWNLOAD_LIMIT_MB:
+            st.info(f"The export is {size_mb:.0f} MB, too large to serve from the dashboard. "
+                    f"It is saved at `{path}`.")
+            return
+
+        # The file is read into memory only in the run where the user asked for it, so
+        # auto-refresh reruns don't reload it; the next rerun releases it again
+        if st.button("⬇️ Prepare download", key=f"{key_prefix}_prepare"):
+            with open(path, 'rb') as file:
+                st.download_button("⬇️ Download", data=file.read(), file_name=os.path.basename(path),
+                                   mime="text/csv" if path.endswith('.csv') else "application/octet-stream",
+                                   key=f"{key_prefix}_download")
+
 def line_chart(df):
     """Create subplots for Temp, Humidity, CO2 with separate y-axes and downsampling."""
-    df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
-    df.set_index('timestamp', inplace=True)
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
 
-    # Only keep numeric columns for resampling
+    # Only keep numeric columns for resampling (timestamps already arrive as datetime64)
     numeric_cols = ['temperature', 'humidity', 'co2']
-    resampled_df = df[numeric_cols].resample('15min').mean()
+
+    # Step-hold: deadband sensors stay silent while unchanged, so each device keeps its
+    # last value through empty 15-minute bins (one bin at most, longer gaps are outages)
+    resampled_df = (
+        df.set_index('timestamp')
+          .groupby('device_key')[numeric_cols]
+          .resample('15min').mean()
+          .groupby(level='device_key').ffill(limit=1)
+          .groupby(level='timestamp').mean()
+    )
     resampled_df.reset_index(inplace=True)
 
     # Plotting
@@ -55,15 +152,15 @@ def line_chart(df):
     )
 
     fig.add_trace(go.Scatter(x=resampled_df['timestamp'], y=resampled_df['temperature'],
-                             mode='lines+markers', name='Temperature (°C)', line=dict(color='tomato')),
+                             mode='lines+markers', name='Temperature (°C)', line=dict(color='tomato', shape='hv')),
                   row=1, col=1)
 
     fig.add_trace(go.Scatter(x=resampled_df['timestamp'], y=resampled_df['humidity'],
-                             mode='lines+markers', name='Humidity (%)', line=dict(color='royalblue')),
+                             mode='lines+markers', name='Humidity (%)', line=dict(color='royalblue', shape='hv')),
                   row=2, col=1)
 
     fig.add_trace(go.Scatter(x=resampled_df['timestamp'], y=resampled_df['co2'],
-                             mode='lines+markers', name='CO₂ (ppm)', line=dict(color='green')),
+                             mode='lines+markers', name='CO₂ (ppm)', line=dict(color='green', shape='hv')),
                   row=3, col=1)
 
     fig.update_layout(
@@ -75,13 +172,15 @@ def line_chart(df):
 
     return fig
 
-def generate_pie_chart(df,room_label):
+def generate_pie_chart(df,room_label, room=None):
+    import plotly.express as px
+
     # Load alert data once
-    conn = sqlite3.connect("alert_log.db")
+    conn = sqlite3.connect(ALERT_DB_PATH)
     alert_df = pd.read_sql_query("SELECT * FROM alert_log", conn)
     conn.close()
 
-    alert_df['timestamp'] = pd.to_datetime(alert_df['timestamp'], errors='coerce')
+    alert_df['timestamp'] = pd.to_datetime(alert_df['timestamp'], format='ISO8601', errors='coerce')
     alert_df = alert_df[alert_df['timestamp'] > datetime.now() - timedelta(hours=6)]
 
     if alert_df.empty:
@@ -95,14 +194,7 @@ def generate_pie_chart(df,room_label):
 
     else:
         # Pie by alert type for a specific room
-        room_map = {
-            "Living Room": "living_Room",
-            "Kitchen": "kitchen",
-            "Bedroom": "bedroom",
-            "Garage": "garage"
-        }
-        db_room = room_map.get(room_label)
-        room_df = alert_df[alert_df['room'] == db_room]
+        room_df = alert_df[alert_df['room'] == room]
 
         if room_df.empty:
             return px.pie(title=f"No alerts in {room_label}")
@@ -116,8 +208,8 @@ def generate_pie_chart(df,room_label):
     fig.update_layout(height = 450)
     return fig
 
-def pie_chart(df,room_label, key_suffix=""):
-    pie_chart = generate_pie_chart(df, room_label)
+def pie_chart(df,room_label, key_suffix="", room=None):
+    pie_chart = generate_pie_chart(df, room_label, room)
 
     # Styled container
     with st.container():
@@ -138,9 +230,8 @@ def mood_emoji(score):
     else:
         return "🫠"
 
-def generate_bar_chart(df,room_label):
-
-    df = df.reset_index()
+def generate_bar_chart(df,room_label, room=None):
+    import plotly.graph_objects as go
 
     # Shared color map
     room_color_map = {
@@ -150,13 +241,7 @@ def generate_bar_chart(df,room_label):
         "bedroom": "#ff9999"
     }
 
-    # Compute mood score
-    df["temperature_f"] = df["temperature"] * 9/5 + 32
-    df["mood_score"] = 100 - (
-        abs(df["temperature_f"] - 72) * 1.2 +
-        abs(df["humidity"] - 40) * 0.8 +
-        abs(df["co2"] - 450) * 0.05
-    )
+    # mood_score is computed once at ingest (stream_consumer/derived_metrics.py)
 
     def mood_emoji(score):
         if score >= 90:
@@ -169,16 +254,9 @@ def generate_bar_chart(df,room_label):
             return "😤"
         else:
             return "🫠"
-    
-    room_map = {
-        "Living Room": "living_Room",
-        "Kitchen": "kitchen",
-        "Bedroom": "bedroom",
-        "Garage": "garage"
-    }
 
     if room_label == "All":
-        mood_df = df.groupby("room")["mood_score"].mean().reset_index()
+        mood_df = df.groupby("room", observed=True)["mood_score"].mean().reset_index()
         mood_df = mood_df.sort_values("mood_score", ascending=True)
         mood_df["label"] = mood_df["mood_score"].round(1).astype(str) + " " + mood_df["mood_score"].apply(mood_emoji)
 
@@ -203,7 +281,7 @@ def generate_bar_chart(df,room_label):
 
     else:
 
-        room_df = df[df["room"] == room_map[room_label]].sort_values("timestamp").tail(8)
+        room_df = df[df["room"] == room].sort_values("timestamp").tail(8)
         if room_df.empty:
             return go.Figure()  # Empty fallback
 
@@ -217,7 +295,7 @@ def generate_bar_chart(df,room_label):
             text=room_df["label"],
             textposition="outside",
             marker=dict(
-                color=room_color_map.get(room_label, "#888"),
+                color=room_color_map.get(room, "#888"),
             )
         ))
 
@@ -232,8 +310,8 @@ def generate_bar_chart(df,room_label):
     return fig
 
 
-def bar_chart(df, room_label, key_suffix = ""):
-    bar_chart = generate_bar_chart(df, room_label)
+def bar_chart(df, room_label, key_suffix = "", room=None):
+    bar_chart = generate_bar_chart(df, room_label, room)
     
     # Styled container
     with st.container():
@@ -242,7 +320,7 @@ def bar_chart(df, room_label, key_suffix = ""):
         st.markdown("</div>", unsafe_allow_html=True)
 
 
-def render_dash_tab(df, room_label, key_prefix):
+def render_dash_tab(df, room_label, key_prefix, room=None, start_time=None, end_time=None):
     # === Alert ===
     alerts = detect_alerts(df)
     if alerts:
@@ -264,6 +342,11 @@ def render_dash_tab(df, room_label, key_prefix):
             with col4: kpi_card("📈 Total Records", f"{len(df)}", "#2ECC71")
 
             st.markdown("<div style='height: 20px;'></div>", unsafe_allow_html=True)
+
+            # === Percentile KPIs (sketch rollups) ===
+            if start_time is not None and end_time is not None:
+                percentile_kpis(room, start_time, end_time, key_prefix)
+
         # === Line Chart Section ===    
             st.markdown("#### 📈 Environment Metrics Trend (Temp, Humidity, CO₂)")
             linechart = line_chart(df)
@@ -272,7 +355,7 @@ def render_dash_tab(df, room_label, key_prefix):
 
         with colB:
             # === Pie Chart ===
-            pie_chart(df, room_label, key_suffix = key_prefix)
+            pie_chart(df, room_label, key_suffix = key_prefix, room = room)
 
             # === Bar Chart ===
-            bar_chart(df, room_label, key_suffix = key_prefix)
\ No newline at end of file
+            bar_chart(df, room_label, key_suffix = key_prefix, room = room)
\ No newline at end of file
@@ -1,16 +1,15 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 from datetime import datetime, timedelta
-import plotly.express as px
 from streamlit_autorefresh import st_autorefresh
-import uuid
 
 #importing components
 from components import kpi_card, line_chart, pie_chart, bar_chart, render_dash_tab
 from components import render_dash_tab
-from components import detect_alerts
+from components import detect_alerts, export_panel
 from alert import get_recent_alert_count, get_all_alerts
+from sqlite_writer import load_device_registry  # importable via the path set up in components
+from fast_fetch import fetch_sensor_arrays, build_sensor_frame
 
 # Configure page layout
 st.set_page_config(page_title="IoT Sensor Dashboard", layout="wide")
@@ -21,29 +20,25 @@ st_autorefresh(interval=30000, key="auto-refresh")
 # Database path
 DB_PATH = "../storage/sensor_data.db"
 
+# Device registry (devices table) -> one tab per room
+@st.cache_data(ttl=300)
+def load_rooms():
+    """Return {room: label} for every registered room, in registration order."""
+    rooms = {}
+    for _, _, room, label in load_device_registry(DB_PATH):
+        rooms.setdefault(room, label)
+    return rooms
+
 # Load data from DB
-@st.cache_data(ttl=30)
-def load_sensor_data(room=None, hours=2):
-    conn = sqlite3.connect(DB_PATH)
+@st.cache_resource(ttl=30)
+def load_sensor_arrays(room=None, hours=2):
+    """Typed, read-only arrays shared by every session (no per-session pickling or copies)."""
     end_time = datetime.now()
     start_time = end_time - timedelta(hours = hours)
+    return fetch_sensor_arrays(DB_PATH, start_time, end_time, room=room)
 
-    query = """
-        SELECT * FROM sensor_data
-        WHERE datetime(timestamp) >= datetime(?) AND datetime(timestamp) <= datetime(?)
-    """
-    params = [start_time.isoformat(), end_time.isoformat()]
-
-    if room and isinstance(room, str):
-        query += " AND room = ?"
-        params.append(room)
-
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
-
-    if not df.empty:
-        df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
-    return df
+def load_sensor_data(room=None, hours=2):
+    return build_sensor_frame(load_sensor_arrays(room, hours))
 
 # === HEADER ===
 
@@ -96,33 +91,25 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # === Tabs ==== 
-tab_all, tab_living, tab_kitchen, tab_bedroom, tab_garage, tab_data, tab_alert = st.tabs(
-    ["🏠 All Rooms",
-    "🛋️ Living Room",
-    "🍳 Kitchen",
-    "🛏️ Bedroom",
-    "🚗 Garage",
-    "📋 All Data",
+emoji_map = {
+    "All": "🏠",
+    "living_Room": "🛋️",
+    "kitchen": "🍳",
+    "bedroom": "🛏️",
+    "garage": "🚗"
+}
+
+room_labels = load_rooms()
+tab_all, *room_tabs, tab_data, tab_alert = st.tabs(
+    ["🏠 All Rooms"] +
+    [f"{emoji_map.get(room, '📊')} {label}" for room, label in room_labels.items()] +
+    ["📋 All Data",
     f"🚨 Alerts ({get_recent_alert_count()} active)"]
 )
 
-def render_room_tab(room_label: str, key_prefix: str):
-    emoji_map = {
-        "All": "🏠",
-        "Living Room": "🛋️",
-        "Kitchen": "🍳",
-        "Bedroom": "🛏️",
-        "Garage": "🚗"
-    }
-    room_map = {
-        "Living Room": "living_Room",
-        "Kitchen": "kitchen",
-        "Bedroom": "bedroom",
-        "Garage": "garage"
-    }
-
+def render_room_tab(room_label: str, key_prefix: str, room=None):
     # ✅ Get emoji 
-    emoji = emoji_map.get(room_label, "📊")
+    emoji = emoji_map.get(room or room_label, "📊")
 
     with st.container():
         colL, colDt, colD = st.columns([8,1,1])
@@ -143,18 +130,21 @@ def render_room_tab(room_label: str, key_prefix: str):
     cutoff_time = selected_datetime - timedelta(hours=hours_back)
 
     # 🧾 Load & filter data
-    rooms = None if room_label == "All" else room_map.get(room_label)
+    rooms = None if room_label == "All" else room
     df_all = load_sensor_data(room=rooms, hours=24)  # Load all 24 hrs of data
-    df_filtered = df_all[df_all['timestamp'] >= cutoff_time].copy()
+    df_filtered = df_all[df_all['timestamp'] >= cutoff_time]
 
     if df_filtered.empty:
         st.warning("No data available for the selected date and time range.")
         return
 
     # 📊 Render the tab
-    render_dash_tab(df_filtered, room_label, key_prefix)
+    render_dash_tab(df_filtered, room_label, key_prefix,
+                    room=rooms, start_time=cutoff_time, end_time=selected_datetime)
 
 def render_all_data_tab():
+    export_panel(room_labels)
+
     st.markdown("## 📋 All Sensor Data (Latest 50)")
 
     # Load last 2–4 hours to cover recent events (can tweak)
@@ -179,17 +169,9 @@ def render_all_data_tab():
 with tab_all:
     render_room_tab("All", "All")
 
-with tab_living:
-    render_room_tab("Living Room", "living_Room")
-
-with tab_kitchen:
-    render_room_tab("Kitchen", "kitchen")
-
-with tab_bedroom:
-    render_room_tab("Bedroom", "bedroom")
-
-with tab_garage:
-    render_room_tab("Garage", "garage")
+for tab, (room, label) in zip(room_tabs, room_labels.items()):
+    with tab:
+        render_room_tab(label, room, room=room)
 
 with tab_data:
     render_all_data_tab()
@@ -299,9 +281,4 @@ with tab_alert:
 
 # st.dataframe(df.tail(10), use_container_width=True)
 
-# st.download_button(
-#     label="⬇️ Download Full Data as CSV",
-#     data=df.to_csv(index=False).encode("utf-8"),
-#     file_name="filtered_sensor_data.csv",
-#     mime="text/csv"
-# )
+# Export lives in the All Data tab (components.export_panel), streamed in chunks by stream_consumer/export.py
@@ -0,0 +1,87 @@
+# typed NumPy fetch path for the dashboard (replaces pd.read_sql_query)
+
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from block_storage import read_blocks  # importable via the path set up in components
+from sqlite_writer import load_device_registry, BASE_METRICS
+from derived_metrics import DERIVED_METRICS, apply_derived_metrics
+
+METRICS = BASE_METRICS + list(DERIVED_METRICS)
+
+# One record per hot row, filled by np.fromiter straight from the cursor: no COUNT pass,
+# no list of tuples and no float64 scratch copy. Derived metrics are recomputed
+# vectorized (as for cold blocks) instead of being fetched as two more columns.
+_ROW_DTYPE = np.dtype([('timestamp', np.int64), ('device_key', np.int32)] +
+                      [(metric, np.float64) for metric in BASE_METRICS])
+
+# Epoch milliseconds are computed by SQLite, so no timestamp text reaches Python.
+# The range is compared on the ISO text itself so idx_sensor_data_timestamp applies.
+_SELECT = f"""
+    SELECT CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER),
+           device_key, {', '.join(BASE_METRICS)}
+    FROM sensor_data
+    WHERE timestamp >= ? AND timestamp <= ?
+"""
+
+
+def fetch_sensor_arrays(db_path, start_time, end_time, room=None):
+    """Read cold blocks and hot rows into one set of typed arrays.
+
+    Returns {'timestamp': int64 epoch ms, 'device_key': int32, <metric>: float32,
+    'room_codes': int16, 'rooms': [...], 'device_codes': int16, 'device_ids': [...]}.
+    Arrays are read-only so cached results can be shared safely between sessions.
+    """
+    query = _SELECT
+    params = [start_time.isoformat(), end_time.isoformat()]
+    if room and isinstance(room, str):
+        query += " AND device_key IN (SELECT device_key FROM devices WHERE room = ?)"
+        params.append(room)
+
+    cold = read_blocks(start_time, end_time, room=room, db_path=db_path)
+    with sqlite3.connect(db_path) as conn:
+        hot = np.fromiter(conn.execute(query, params), dtype=_ROW_DTYPE)   # NULL metrics become NaN
+    conn.close()
+
+    hot_metrics = apply_derived_metrics({metric: hot[metric] for metric in BASE_METRICS})
+
+    # Cold tier first (older), then the hot rows; one concatenation per column
+    arrays = {
+        'timestamp': np.concatenate([cold['timestamp'], hot['timestamp']]),
+        'device_key': np.concatenate([cold['device_key'], hot['device_key']]).astype(np.int32),
+    }
+    for metric in METRICS:
+        arrays[metric] = np.concatenate([cold[metric], hot_metrics[metric]]).astype(np.float32)
+
+    # Device keys -> categorical codes through the registry
+    registry = load_device_registry(db_path)
+    rooms = list(dict.fromkeys(room_id for _, _, room_id, _ in registry))
+    max_key = max((key for key, _, _, _ in registry), default=0)
+    room_lookup = np.full(max_key + 1, -1, dtype=np.int16)
+    device_lookup = np.full(max_key + 1, -1, dtype=np.int16)
+    for index, (key, _, room_id, _) in enumerate(registry):
+        room_lookup[key] = rooms.index(room_id)
+        device_lookup[key] = index
+
+    arrays['room_codes'] = room_lookup[arrays['device_key']]
+    arrays['device_codes'] = device_lookup[arrays['device_key']]
+    for values in arrays.values():
+        values.flags.writeable = False
+
+    arrays['rooms'] = rooms
+    arrays['device_ids'] = [device_id for _, device_id, _, _ in registry]
+    return arrays
+
+
+def build_sensor_frame(arrays):
+    """Wrap fetched arrays in a DataFrame without copying them."""
+    columns = {
+        'timestamp': arrays['timestamp'].view('datetime64[ms]'),
+        'device_key': arrays['device_key'],
+        'device_id': pd.Categorical.from_codes(arrays['device_codes'], categories=arrays['device_ids']),
+        'room': pd.Categorical.from_codes(arrays['room_codes'], categories=arrays['rooms']),
+    }
+    for metric in METRICS:
+        columns[metric] = arrays[metric]
+    return pd.DataFrame(columns, copy=False)
@@ -11,10 +11,15 @@ MQTT_BROKER = 'localhost'  # Change to your MQTT broker address
 MQTT_PORT = 1883
 MQTT_TOPIC = 'iot/sensor/data'
 
-# MQTT client setup
-client = mqtt.Client()
-client.connect(MQTT_BROKER, MQTT_PORT, 60)
-
+# Reporting configuration
+SAMPLE_SECONDS = 20          # how often every sensor is sampled
+REPORT_MODE = 'interval'     # 'interval' = publish every sample, 'deadband' = report by exception
+HEARTBEAT_SECONDS = 300      # deadband mode: publish at least this often even if nothing changed
+DEADBAND = {                 # deadband mode: publish when a metric moves beyond abs and/or pct
+    "temperature": {"abs": 0.5},
+    "humidity": {"abs": 2.0},
+    "co2": {"pct": 5.0},
+}
 
 # similated rooms 
 rooms = ['living_Room','kitchen', 'bedroom', 'garage']
@@ -38,14 +43,54 @@ def generate_sensor_data(room):
     return sensor_data
 
 
-while True:
-    for room in rooms:
-        sensor_data = generate_sensor_data(room)
-        payload = json.dumps(sensor_data)
-        
-        # Publish the sensor data to the MQTT topic
-        client.publish(MQTT_TOPIC, payload)
-        print(f"Published data: {payload} to topic: {MQTT_TOPIC}")
-    
-    # Sleep for a while before the next iteration
-    time.sleep(20)  # Sleep for 20 seconds before the next round of data generation
+# last published reading and time per room (deadband mode)
+last_reported = {}
+
+def exceeds_deadband(previous, sensor_data):
+    """True if any metric moved beyond its absolute or percent deadband since the last report."""
+    for metric, band in DEADBAND.items():
+        change = abs(sensor_data[metric] - previous[metric])
+        if "abs" in band and change > band["abs"]:
+            return True
+        if "pct" in band and change > abs(previous[metric]) * band["pct"] / 100:
+            return True
+    return False
+
+def should_report(room, sensor_data):
+    """Report-by-exception: first reading, deadband exceeded, or heartbeat due."""
+    if REPORT_MODE != 'deadband':
+        return True
+
+    previous = last_reported.get(room)
+    now = time.monotonic()
+    if (previous is None
+            or now - previous["sent_at"] >= HEARTBEAT_SECONDS
+            or exceeds_deadband(previous["reading"], sensor_data)):
+        last_reported[room] = {"sent_at": now, "reading": sensor_data}
+        return True
+    return False
+
+
+def main():
+    # MQTT client setup (connecting on import would make the module unusable as a library)
+    client = mqtt.Client()
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+
+    while True:
+        for room in rooms:
+            sensor_data = generate_sensor_data(room)
+            if not should_report(room, sensor_data):
+                continue  # Within the deadband: the consumer holds the last reported value
+
+            payload = json.dumps(sensor_data)
+
+            # Publish the sensor data to the MQTT topic
+            client.publish(MQTT_TOPIC, payload)
+            print(f"Published data: {payload} to topic: {MQTT_TOPIC}")
+
+        # Sleep for a while before the next iteration
+        time.sleep(SAMPLE_SECONDS)  # Sleep for 20 seconds before the next round of data generation
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# streaming anomaly detection for real-time IoT analytics
+
+import math
+
+# Metrics tracked per device and the label used in the alert type
+METRIC_LABELS = {
+    "temperature": "Temperature",
+    "humidity": "Humidity",
+    "co2": "CO₂",
+}
+
+ANOMALY_CONFIG = {
+    "alpha": 0.05,             # smoothing for the spike baseline (mean + variance)
+    "fast_alpha": 0.3,         # smoothing for the local level the noise is measured around
+    "z_threshold": 4.0,        # |reading - baseline| / std that counts as a spike
+    "drift_slack": 1.0,        # CUSUM allowance: deviations below this many noise stds are ignored
+    "drift_threshold": 10.0,   # CUSUM sum (in noise stds) that counts as a drift
+    "drift_settle": 1000,      # readings without a new CUSUM crossing before a drift is over
+    "warmup": 30,              # readings needed before a device/metric can alert
+    "min_std": 1e-6,           # guard against a flat signal
+}
+
+# (device_id, metric) -> [count, mean, var, fast_mean, noise_var, reference, cusum_up, cusum_down,
+#                         drifting (+1 up, -1 down, 0 none), quiet]
+# One small list per device and metric, updated in place: O(1) memory and time per reading.
+_state = {}
+
+
+def reset_state():
+    """Forget all learned baselines."""
+    _state.clear()
+
+
+def update_metric(device_id, metric, value, config=ANOMALY_CONFIG):
+    """Update the detector state for one metric and return 'Spike', 'Drift' or None.
+
+    Spikes are scored against a fast-adapting EWMA baseline. Drifts use a two-sided
+    CUSUM against a reference level that stays fixed until a drift is detected, so a
+    slow ramp accumulates evidence instead of being absorbed by the baseline.
+    """
+    key = (device_id, metric)
+    state = _state.get(key)
+    if state is None:
+        _state[key] = [1, value, 0.0, value, 0.0, None, 0.0, 0.0, 0, 0]
+        return None
+
+    count, mean, var, fast_mean, noise_var, reference, cusum_up, cusum_down, drifting, quiet = state
+    std = max(math.sqrt(var), config["min_std"])
+    warmed_up = count >= config["warmup"]
+
+    # Score the reading against the baseline before it absorbs the reading
+    anomaly = None
+    if warmed_up and abs(value - mean) > config["z_threshold"] * std:
+        anomaly = "Spike"
+
+    # Exponentially weighted mean and variance (incremental form)
+    diff = value - mean
+    incr = config["alpha"] * diff
+    mean += incr
+    var = (1 - config["alpha"]) * (var + diff * incr)
+    # Noise around the local level; unlike var it is not inflated by a level shift
+    noise = value - fast_mean
+    noise_var = (1 - config["alpha"]) * noise_var + config["alpha"] * noise * noise
+    fast_mean += config["fast_alpha"] * noise
+
+    if warmed_up:
+        if reference is None:
+            reference = mean   # Frozen once warm; only moved when a drift is detected
+
+        # CUSUM of the standardized deviation from the reference level
+        noise_std = max(math.sqrt(noise_var), config["min_std"])
+        z = (value - reference) / noise_std
+        cusum_up = max(0.0, cusum_up + z - config["drift_slack"])
+        cusum_down = max(0.0, cusum_down - z - config["drift_slack"])
+        quiet += 1
+
+        if max(cusum_up, cusum_down) > config["drift_threshold"] and anomaly is None:
+            # Report on entry only; a continuing ramp keeps crossing in the same direction
+            # (re-anchored each time) and stays one drift
+            direction = 1 if cusum_up > cusum_down else -1
+            if direction != drifting:
+                anomaly = "Drift"
+            drifting = direction
+            reference, cusum_up, cusum_down, quiet = fast_mean, 0.0, 0.0, 0
+        elif drifting and quiet >= config["drift_settle"]:
+            drifting = 0   # Settled at the new level
+
+    state[0] = count + 1
+    state[1] = mean
+    state[2] = var
+    state[3] = fast_mean
+    state[4] = noise_var
+    state[5] = reference
+    state[6] = cusum_up
+    state[7] = cusum_down
+    state[8] = drifting
+    state[9] = quiet
+    return anomaly
+
+
+def detect_anomalies(sensor_data, config=ANOMALY_CONFIG):
+    """Feed one reading through the detector and return alerts as (timestamp, room, alert_type, value)."""
+    alerts = []
+    device_id = sensor_data['device_id']
+
+    for metric, label in METRIC_LABELS.items():
+        value = sensor_data.get(metric)
+        if value is None:
+            continue
+
+        anomaly = update_metric(device_id, metric, float(value), config)
+        if anomaly:
+            alerts.append((sensor_data['timestamp'], sensor_data['room'], f"{label} {anomaly}", value))
+
+    return alerts
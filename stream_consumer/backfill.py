@@ -0,0 +1,247 @@
+# bulk backfill importer and accelerated MQTT replay for real-time IoT analytics
+#
+# usage:
+#   python stream_consumer/backfill.py import storage/sensor_data_2025-06-16.csv
+#   python stream_consumer/backfill.py import old_sensor_data.db
+#   python stream_consumer/backfill.py replay --speed 60 --start 2025-06-16T23:00
+
+import argparse
+import csv
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+from block_storage import BLOCK_MINUTES, decode_block, ensure_block_table, to_epoch_ms
+from export import iter_export_rows
+from sqlite_writer import (DB_PATH, READING_KEY_SQL, device_key_cache, ensure_db, get_device_key,
+                           insert_sensor_batch, reading_key, table_columns)
+from sketch_rollups import add_to_sketches, ensure_sketch_table, flush_sketches
+
+CHUNK_SIZE = 5000            # rows per executemany
+CHUNKS_PER_TRANSACTION = 20  # commit every 100k rows
+
+METRICS = ['temperature', 'humidity', 'co2']
+
+# MQTT defaults, same as publisher.py
+MQTT_BROKER = 'localhost'
+MQTT_PORT = 1883
+MQTT_TOPIC = 'iot/sensor/data'
+
+
+def read_csv_chunks(path, chunk_size=CHUNK_SIZE):
+    """Stream a sensor CSV (csv_writer.py layout) as lists of reading dicts."""
+    with open(path, newline='') as file:
+        chunk = []
+        for row in csv.DictReader(file):
+            for metric in METRICS:
+                row[metric] = float(row[metric])
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _read_legacy_chunks(conn, chunk_size, start=None, end=None):
+    """Readings of a database from before the devices table (TEXT device columns, no cold tier)."""
+    query = "SELECT timestamp, device_id, room, temperature, humidity, co2 FROM sensor_data WHERE 1 = 1"
+    params = []
+    if start:
+        query += " AND datetime(timestamp) >= datetime(?)"
+        params.append(start)
+    if end:
+        query += " AND datetime(timestamp) <= datetime(?)"
+        params.append(end)
+
+    cursor = conn.execute(query + " ORDER BY timestamp", params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def read_sqlite_chunks(path, chunk_size=CHUNK_SIZE, start=None, end=None):
+    """Stream readings from a sensor_data SQLite database in timestamp order.
+
+    Device-keyed databases are read through the export path, so readings already
+    compacted into sensor_blocks (the cold tier) are included.
+    """
+    columns = ['timestamp', 'device_id', 'room'] + METRICS
+    with sqlite3.connect(path) as conn:
+        legacy = 'device_id' in table_columns(conn, 'sensor_data')
+        if legacy:
+            for rows in _read_legacy_chunks(conn, chunk_size, start, end):
+                yield [dict(zip(columns, row)) for row in rows]
+    if legacy:
+        return
+
+    start_time = datetime.fromisoformat(start) if start else datetime.min
+    end_time = datetime.fromisoformat(end) if end else datetime(9999, 1, 1)   # SQLite rejects datetime.max
+    # Export rows carry the derived metrics too; they are recomputed on insert
+    for rows in iter_export_rows(start_time, end_time, db_path=path, chunk_size=chunk_size):
+        yield [dict(zip(columns, row)) for row in rows]
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, start=None, end=None):
+    if path.endswith('.csv'):
+        return read_csv_chunks(path, chunk_size)
+    return read_sqlite_chunks(path, chunk_size, start, end)
+
+
+def _new_readings(conn, chunk, block_stamps):
+    """The readings of a chunk that the database doesn't hold yet, hot or cold.
+
+    A reading matches on device and millisecond; block_stamps caches the decoded
+    timestamps of cold blocks, {(device_key, block_start): set of epoch ms}.
+    """
+    block_ms = BLOCK_MINUTES * 60000
+    cache = device_key_cache(conn)
+    seen = set()
+    new = []
+    for sensor_data in chunk:
+        device_key = get_device_key(conn, sensor_data['device_id'], sensor_data['room'], cache)
+        key = (device_key, reading_key(sensor_data['timestamp']))
+        if key in seen:
+            continue
+        seen.add(key)
+
+        if conn.execute(f"SELECT 1 FROM sensor_data WHERE device_key = ? AND {READING_KEY_SQL} = ?",
+                        key).fetchone():
+            continue
+        ts = to_epoch_ms(sensor_data['timestamp'])
+        block = (device_key, ts - ts % block_ms)
+        if block not in block_stamps:
+            row = conn.execute("SELECT payload FROM sensor_blocks WHERE device_key = ? AND block_start = ?",
+                               block).fetchone()
+            block_stamps[block] = set(decode_block(row[0])[0].tolist()) if row else set()
+        if ts not in block_stamps[block]:
+            new.append(sensor_data)
+    return new
+
+
+def bulk_import(path, db_path=DB_PATH, chunk_size=CHUNK_SIZE, rollups=True):
+    """Load a CSV or SQLite file into sensor_data with batched, relaxed-durability transactions.
+
+    Readings the database already holds (same device and millisecond, hot or cold) are
+    skipped, so an interrupted load can be re-run and overlapping sources don't add
+    rows or sketch counts twice. Returns the number of rows imported.
+    """
+    ensure_db(db_path)
+    ensure_block_table(db_path)
+    if rollups:
+        # Created lazily otherwise, from a second connection that would wait on our BEGIN
+        ensure_sketch_table(db_path)
+    conn = sqlite3.connect(db_path, isolation_level=None)  # explicit BEGIN/COMMIT below
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+
+    # Committed chunks are skipped on a re-run, so durability is traded for speed while loading.
+    # The database stays in WAL mode: leaving it needs exclusive access, which a running
+    # consumer or dashboard would deny, and WAL appends are already sequential.
+    conn.execute("PRAGMA synchronous = OFF")
+
+    imported = 0
+    started = time.perf_counter()
+    try:
+        block_stamps = {}
+        conn.execute("BEGIN")
+        for i, chunk in enumerate(read_chunks(path, chunk_size), start=1):
+            new = _new_readings(conn, chunk, block_stamps)
+            insert_sensor_batch(conn, new)
+            imported += len(new)
+
+            if rollups:
+                # Only new readings: already stored ones were counted when they were stored
+                for sensor_data in new:
+                    add_to_sketches(sensor_data, db_path=db_path)
+
+            if i % CHUNKS_PER_TRANSACTION == 0:
+                conn.execute("COMMIT")
+                # Sketches are written by their own connection, so only outside our transaction
+                if rollups:
+                    flush_sketches(force=True, db_path=db_path)
+                conn.execute("BEGIN")
+                print(f"📦 {imported} rows ({imported / (time.perf_counter() - started):,.0f} rows/s)")
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.close()
+
+    if rollups:
+        flush_sketches(force=True, db_path=db_path)
+    return imported
+
+
+def replay(path=DB_PATH, speed=1.0, start=None, end=None, keep_timestamps=False,
+           broker=MQTT_BROKER, port=MQTT_PORT, topic=MQTT_TOPIC):
+    """Re-publish stored readings to MQTT, preserving their spacing divided by `speed`."""
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client()
+    client.connect(broker, port, 60)
+    client.loop_start()
+
+    first_ts = None
+    wall_start = time.monotonic()
+    published = 0
+    try:
+        for chunk in read_chunks(path, start=start, end=end):
+            for sensor_data in chunk:
+                ts = datetime.fromisoformat(sensor_data['timestamp'])
+                if first_ts is None:
+                    first_ts = ts
+
+                # Schedule against the start so sleep jitter does not accumulate
+                delay = wall_start + (ts - first_ts).total_seconds() / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                if not keep_timestamps:
+                    sensor_data['timestamp'] = datetime.now().isoformat()
+                client.publish(topic, json.dumps(sensor_data))
+                published += 1
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+    elapsed = time.monotonic() - wall_start
+    print(f"📡 Replayed {published} readings in {elapsed:.1f}s ({published / max(elapsed, 1e-9):,.1f} msg/s)")
+    return published
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill sensor_data.db or replay stored readings to MQTT")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_cmd = commands.add_parser("import", help="bulk-load a CSV or SQLite file into sensor_data.db")
+    import_cmd.add_argument("path", help="sensor_data_*.csv or a sensor_data SQLite database")
+    import_cmd.add_argument("--db", default=DB_PATH, help="target database")
+    import_cmd.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    import_cmd.add_argument("--no-rollups", action="store_true", help="skip building quantile sketches")
+
+    replay_cmd = commands.add_parser("replay", help="re-publish stored readings to MQTT at N× speed")
+    replay_cmd.add_argument("path", nargs="?", default=DB_PATH, help="CSV or SQLite source (default: sensor_data.db)")
+    replay_cmd.add_argument("--speed", type=float, default=1.0, help="time compression factor, e.g. 60 = 1h per minute")
+    replay_cmd.add_argument("--start", help="ISO timestamp to start from (SQLite sources)")
+    replay_cmd.add_argument("--end", help="ISO timestamp to stop at (SQLite sources)")
+    replay_cmd.add_argument("--keep-timestamps", action="store_true", help="publish original instead of current timestamps")
+    replay_cmd.add_argument("--broker", default=MQTT_BROKER)
+    replay_cmd.add_argument("--port", type=int, default=MQTT_PORT)
+    replay_cmd.add_argument("--topic", default=MQTT_TOPIC)
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        started = time.perf_counter()
+        rows = bulk_import(args.path, db_path=args.db, chunk_size=args.chunk_size, rollups=not args.no_rollups)
+        elapsed = time.perf_counter() - started
+        print(f"✅ Imported {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    else:
+        replay(args.path, speed=args.speed, start=args.start, end=args.end,
+               keep_timestamps=args.keep_timestamps, broker=args.broker, port=args.port, topic=args.topic)
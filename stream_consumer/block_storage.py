@@ -0,0 +1,306 @@
+# compressed cold storage tier for real-time IoT analytics
+#
+# Closed hourly blocks per device are moved out of sensor_data into sensor_blocks,
+# encoded as delta-of-delta timestamps and per-column deltas of the decimal-scaled
+# readings, each narrowed to the smallest integer width, byte-shuffled and zlib-compressed.
+# Decoding is a decompress plus cumulative sums, so scans stay vectorized end to end.
+
+import argparse
+import math
+import sqlite3
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from derived_metrics import apply_derived_metrics
+from sqlite_writer import DB_PATH, ensure_db
+
+BLOCK_COLUMNS = ['temperature', 'humidity', 'co2']   # float columns stored per block
+MAX_DECIMALS = 4                                     # largest decimal scale tried per column
+BLOCK_MINUTES = 60                                   # span of one block
+HOT_RETENTION_HOURS = 24                             # raw rows kept uncompressed for the dashboard
+COMPACT_INTERVAL_SECONDS = 3600                      # how often the consumer compacts
+COMPACT_BUDGET_SECONDS = 0.2                         # compaction time per ingest batch (whole hours)
+
+EPOCH = datetime(1970, 1, 1)
+_HEADER = struct.Struct('<BI')   # version, row count
+_VERSION = 2
+_ZLIB_LEVEL = 6
+
+_last_compaction = 0.0
+_compaction_backlog = False   # the last run stopped at its budget with hours left
+
+# databases whose sensor_blocks table exists (created on first use, not at import)
+_initialized = set()
+
+
+def to_epoch_ms(timestamp):
+    """ISO timestamp text (naive, as written by the publisher) -> epoch milliseconds."""
+    return (datetime.fromisoformat(timestamp) - EPOCH) // timedelta(milliseconds=1)
+
+
+def _decimal_scale(values):
+    """Smallest number of decimals that reproduces every value exactly, or 0 if none does.
+
+    Readings are published rounded (e.g. 23.45); scaled to integers, consecutive
+    readings differ by small deltas that fit in one or two bytes.
+    """
+    for decimals in range(1, MAX_DECIMALS + 1):
+        factor = 10 ** decimals
+        # -0.0 would come back as 0.0 after scaling, so it keeps the column unscaled
+        if all(abs(v) < 2 ** 52 / factor and round(v * factor) / factor == v
+               and (v != 0 or math.copysign(1.0, v) > 0) for v in values):
+            return decimals
+    return 0
+
+
+def _narrow(values):
+    """Smallest little-endian integer dtype holding every value of an int64 array."""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in ('<i1', '<i2', '<i4'):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values.astype('<i8')
+
+
+def _shuffle(values):
+    """Byte-shuffle: all first bytes, then all second bytes, ... (runs zlib compresses well)."""
+    return values.view(np.uint8).reshape(len(values), values.itemsize).T.tobytes()
+
+
+def _unshuffle(data, offset, n, dtype):
+    size = n * np.dtype(dtype).itemsize
+    planes = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+    return planes.reshape(-1, n).T.copy().view(dtype).ravel(), offset + size
+
+
+def encode_block(timestamps, columns):
+    """Encode epoch-ms timestamps and {column: values} into a compressed payload."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    # First timestamp, first delta, then delta-of-deltas (0 for a regular publish interval)
+    deltas = np.diff(timestamps, prepend=0)
+    dods = deltas.copy()
+    dods[2:] = np.diff(deltas[1:])
+    streams = [_narrow(dods)]
+
+    scales = []
+    for name in BLOCK_COLUMNS:
+        values = np.asarray(columns[name], dtype=np.float64)
+        decimals = _decimal_scale(values.tolist())
+        if decimals:
+            ints = np.round(values * 10 ** decimals).astype(np.int64)
+            streams.append(_narrow(np.diff(ints, prepend=0)))
+        else:
+            # Not a short decimal: XOR of consecutive float bit patterns, stored as-is
+            bits = values.view('<u8')
+            xors = bits.copy()
+            xors[1:] ^= bits[:-1]
+            streams.append(xors)
+        scales.append(decimals)
+
+    widths = bytes(stream.itemsize for stream in streams)
+    body = zlib.compress(b''.join(_shuffle(stream) for stream in streams), _ZLIB_LEVEL)
+    return _HEADER.pack(_VERSION, len(timestamps)) + bytes(scales) + widths + body
+
+
+def decode_block(payload):
+    """Decode a payload into (int64 epoch-ms timestamps, {column: float64 array})."""
+    version, n = _HEADER.unpack_from(payload)
+    if version != _VERSION:
+        raise ValueError(f"Unsupported block version {version}")
+
+    offset = _HEADER.size
+    scales = payload[offset:offset + len(BLOCK_COLUMNS)]
+    widths = payload[offset + len(BLOCK_COLUMNS):offset + 2 * len(BLOCK_COLUMNS) + 1]
+    data = zlib.decompress(payload[offset + 2 * len(BLOCK_COLUMNS) + 1:])
+
+    dods, pos = _unshuffle(data, 0, n, f'<i{widths[0]}')
+    deltas = dods.astype(np.int64)
+    deltas[1:] = np.cumsum(deltas[1:])
+    timestamps = np.cumsum(deltas)
+
+    columns = {}
+    for name, decimals, width in zip(BLOCK_COLUMNS, scales, widths[1:]):
+        if decimals:
+            diffs, pos = _unshuffle(data, pos, n, f'<i{width}')
+            columns[name] = np.cumsum(diffs, dtype=np.int64) / 10 ** decimals
+        else:
+            xors, pos = _unshuffle(data, pos, n, '<u8')
+            columns[name] = np.bitwise_xor.accumulate(xors).view(np.float64)
+    return timestamps, columns
+
+
+def init_block_table(db_path=DB_PATH):
+    """Create the sensor_blocks table if it doesn't exist."""
+    ensure_db(db_path)  # blocks reference the devices table
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sensor_blocks (
+                device_key INTEGER NOT NULL REFERENCES devices(device_key),
+                block_start INTEGER NOT NULL,
+                block_end INTEGER NOT NULL,
+                n_rows INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (device_key, block_start)
+            )
+        ''')
+        conn.commit()
+    conn.close()
+    _initialized.add(db_path)
+
+
+def ensure_block_table(db_path=DB_PATH):
+    """Create the sensor_blocks table on first use in this process."""
+    if db_path not in _initialized:
+        init_block_table(db_path)
+
+
+def _write_block(conn, device_key, block_start, rows):
+    """Encode rows [(ts_ms, temperature, humidity, co2)] into the block, merging late rows."""
+    existing = conn.execute(
+        "SELECT payload FROM sensor_blocks WHERE device_key = ? AND block_start = ?",
+        (device_key, block_start)
+    ).fetchone()
+    if existing:
+        timestamps, columns = decode_block(existing[0])
+        rows = list(zip(timestamps.tolist(), *(columns[c].tolist() for c in BLOCK_COLUMNS))) + rows
+    rows.sort(key=lambda row: row[0])
+    # A late row for a millisecond the block already holds is the same reading again
+    rows = [row for i, row in enumerate(rows) if i == 0 or row[0] != rows[i - 1][0]]
+
+    timestamps = [row[0] for row in rows]
+    columns = {name: [row[i + 1] for row in rows] for i, name in enumerate(BLOCK_COLUMNS)}
+    conn.execute('''
+        INSERT OR REPLACE INTO sensor_blocks (device_key, block_start, block_end, n_rows, payload)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (device_key, block_start, block_start + BLOCK_MINUTES * 60000, len(rows),
+          encode_block(timestamps, columns)))
+
+
+def _compact_hours(hot_hours=HOT_RETENTION_HOURS, db_path=DB_PATH):
+    """Compact closed blocks past the hot window one block hour at a time, oldest first.
+
+    Each hour is its own transaction (its blocks appear and its raw rows disappear
+    together), so memory stays bounded by one hour of readings and a caller can stop
+    between hours. Yields the number of raw rows compacted per hour.
+    """
+    cutoff = (datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hot_hours)).isoformat()
+    block_ms = BLOCK_MINUTES * 60000
+
+    ensure_block_table(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        while True:
+            # ISO text compares in time order, so both lookups use idx_sensor_data_timestamp
+            oldest = conn.execute("SELECT MIN(timestamp) FROM sensor_data WHERE timestamp < ?",
+                                  (cutoff,)).fetchone()[0]
+            if oldest is None:
+                return
+            ts = to_epoch_ms(oldest)
+            hour_start = EPOCH + timedelta(milliseconds=ts - ts % block_ms)
+            hour_end = min((hour_start + timedelta(milliseconds=block_ms)).isoformat(), cutoff)
+
+            cursor = conn.execute('''
+                SELECT rowid, timestamp, device_key, temperature, humidity, co2 FROM sensor_data
+                WHERE timestamp >= ? AND timestamp < ?
+            ''', (oldest, hour_end))   # from the oldest row itself, so every pass makes progress
+
+            blocks = {}
+            rowids = []
+            for rowid, timestamp, device_key, temperature, humidity, co2 in cursor:
+                ts = to_epoch_ms(timestamp)
+                blocks.setdefault((device_key, ts - ts % block_ms), []).append((ts, temperature, humidity, co2))
+                rowids.append((rowid,))
+
+            for (device_key, block_start), rows in blocks.items():
+                _write_block(conn, device_key, block_start, rows)
+            conn.executemany("DELETE FROM sensor_data WHERE rowid = ?", rowids)
+            conn.commit()
+            yield len(rowids)
+    finally:
+        conn.close()
+
+
+def compact_closed_blocks(hot_hours=HOT_RETENTION_HOURS, db_path=DB_PATH):
+    """Move closed blocks older than the hot window from sensor_data into sensor_blocks.
+
+    Returns the number of raw rows compacted.
+    """
+    return sum(_compact_hours(hot_hours, db_path))
+
+
+def compact_if_due(db_path=DB_PATH):
+    """Run compaction at most once per COMPACT_INTERVAL_SECONDS, for at most COMPACT_BUDGET_SECONDS.
+
+    Called from the ingest worker: a backlog (e.g. the first run on a large database)
+    is worked off a few hours per call, on every call until it is gone.
+    """
+    global _last_compaction, _compaction_backlog
+
+    now = time.monotonic()
+    if not _compaction_backlog and _last_compaction and now - _last_compaction < COMPACT_INTERVAL_SECONDS:
+        return 0
+    _last_compaction = now
+
+    moved = 0
+    hours = _compact_hours(db_path=db_path)
+    _compaction_backlog = False
+    for rows in hours:
+        moved += rows
+        if time.monotonic() - now > COMPACT_BUDGET_SECONDS:
+            _compaction_backlog = True
+            break
+    hours.close()
+    return moved
+
+
+def read_blocks(start_time, end_time, room=None, db_path=DB_PATH):
+    """Decode the cold blocks overlapping [start_time, end_time] into NumPy arrays.
+
+    Returns {'timestamp': int64 epoch ms, 'device_key': int64, <column>: float64}.
+    Derived metrics are not stored in blocks; they are recomputed here, vectorized.
+    """
+    start_ms = (start_time - EPOCH) // timedelta(milliseconds=1)
+    end_ms = (end_time - EPOCH) // timedelta(milliseconds=1)
+
+    query = '''
+        SELECT device_key, payload FROM sensor_blocks
+        WHERE block_end > ? AND block_start <= ?
+    '''
+    params = [start_ms, end_ms]
+    if room and isinstance(room, str):
+        query += " AND device_key IN (SELECT device_key FROM devices WHERE room = ?)"
+        params.append(room)
+
+    parts = {name: [] for name in ['timestamp', 'device_key'] + BLOCK_COLUMNS}
+    ensure_block_table(db_path)
+    with sqlite3.connect(db_path) as conn:
+        for device_key, payload in conn.execute(query, params):
+            timestamps, columns = decode_block(payload)
+            mask = (timestamps >= start_ms) & (timestamps <= end_ms)
+            parts['timestamp'].append(timestamps[mask])
+            parts['device_key'].append(np.full(int(mask.sum()), device_key, dtype=np.int64))
+            for name in BLOCK_COLUMNS:
+                parts[name].append(columns[name][mask])
+
+    result = {name: np.concatenate(arrays) if arrays
+              else np.empty(0, dtype=np.float64 if name in BLOCK_COLUMNS else np.int64)
+              for name, arrays in parts.items()}
+    return apply_derived_metrics(result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact closed sensor_data blocks into compressed storage")
+    parser.add_argument("--hot-hours", type=int, default=HOT_RETENTION_HOURS,
+                        help="hours of raw rows to keep uncompressed")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    init_block_table(args.db)
+    started = time.perf_counter()
+    moved = compact_closed_blocks(hot_hours=args.hot_hours, db_path=args.db)
+    print(f"🧊 Compacted {moved} rows into sensor_blocks in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,47 @@
+# derived metrics computed once at ingest for real-time IoT analytics
+#
+# Each registered function receives a mapping of metric values and returns the
+# derived value. The same function serves single readings (floats) and batches
+# (NumPy arrays), so it is written with plain arithmetic and abs().
+# A metric whose inputs are missing or None (e.g. NULL legacy columns) is None;
+# in arrays a missing value is already NaN and simply propagates.
+
+# name -> function, applied in registration order (later metrics may use earlier ones)
+DERIVED_METRICS = {}
+
+# name -> metric names the function reads
+DERIVED_INPUTS = {}
+
+
+def derived_metric(name, inputs):
+    """Register a derived metric; it is stored as a REAL column of sensor_data."""
+    def register(func):
+        DERIVED_METRICS[name] = func
+        DERIVED_INPUTS[name] = list(inputs)
+        return func
+    return register
+
+
+def apply_derived_metrics(values):
+    """Add every derived metric to `values` (a reading dict or a dict of arrays) in place."""
+    for name, func in DERIVED_METRICS.items():
+        if any(values.get(i) is None for i in DERIVED_INPUTS[name]):
+            values[name] = None
+        else:
+            values[name] = func(values)
+    return values
+
+
+@derived_metric("temperature_f", inputs=["temperature"])
+def temperature_f(values):
+    return values["temperature"] * 9 / 5 + 32
+
+
+@derived_metric("mood_score", inputs=["temperature_f", "humidity", "co2"])
+def mood_score(values):
+    """Weighted comfort index, 100 = ideal (see README: Mood Score Formula)."""
+    return 100 - (
+        abs(values["temperature_f"] - 72) * 1.2 +
+        abs(values["humidity"] - 40) * 0.8 +
+        abs(values["co2"] - 450) * 0.05
+    )
@@ -0,0 +1,230 @@
+# streaming export of sensor readings to CSV or Parquet for real-time IoT analytics
+#
+# Rows are pulled from sensor_data.db (cold blocks first, then hot rows) in fixed-size
+# chunks and written straight to the output, so memory stays bounded for any range.
+#
+# usage:
+#   python stream_consumer/export.py --start 2025-06-01 --end 2025-06-16 -o june.csv
+#   python stream_consumer/export.py --rooms kitchen garage --days 7 -o week.parquet
+
+import argparse
+import csv
+import importlib.util
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from block_storage import EPOCH, BLOCK_COLUMNS, decode_block, ensure_block_table
+from derived_metrics import DERIVED_METRICS, apply_derived_metrics
+from sqlite_writer import DB_PATH, BASE_METRICS
+
+CHUNK_SIZE = 10000        # rows per fetchmany / write
+ROW_GROUP_SIZE = 100000   # rows per Parquet row group (the largest buffer held in memory)
+EXPORT_FORMATS = ['csv', 'parquet']
+EXPORT_DIR = os.path.join(os.path.dirname(DB_PATH), 'exports')
+EXPORT_RETENTION_HOURS = 24   # dashboard exports older than this are deleted
+
+EXPORT_COLUMNS = ['timestamp', 'device_id', 'room'] + BASE_METRICS + list(DERIVED_METRICS)
+
+
+def parquet_available():
+    """Parquet output needs the optional pyarrow package (looked up, not imported)."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _room_filter(rooms, column='device_key'):
+    """SQL condition + params restricting `column` to the devices of the given rooms."""
+    if not rooms:
+        return "", []
+    if isinstance(rooms, str):
+        rooms = [rooms]
+    placeholders = ', '.join('?' * len(rooms))
+    return f" AND {column} IN (SELECT device_key FROM devices WHERE room IN ({placeholders}))", list(rooms)
+
+
+def _cold_chunks(conn, start_time, end_time, rooms, devices):
+    """Decode sensor_blocks into export rows, one time-ordered list per block hour."""
+    start_ms = (start_time - EPOCH) // timedelta(milliseconds=1)
+    end_ms = (end_time - EPOCH) // timedelta(milliseconds=1)
+    room_sql, room_params = _room_filter(rooms)
+
+    cursor = conn.execute('''
+        SELECT block_start, device_key, payload FROM sensor_blocks
+        WHERE block_end > ? AND block_start <= ?
+    ''' + room_sql + " ORDER BY block_start, device_key", [start_ms, end_ms] + room_params)
+
+    hour, current = None, []
+    for block_start, device_key, payload in cursor:
+        # Devices of the same hour are interleaved so the export stays in timestamp order
+        if block_start != hour and current:
+            current.sort(key=lambda row: row[0])
+            yield current
+            current = []
+        hour = block_start
+
+        timestamps, columns = decode_block(payload)
+        mask = (timestamps >= start_ms) & (timestamps <= end_ms)
+        if not mask.any():
+            continue
+
+        values = {name: columns[name][mask] for name in BLOCK_COLUMNS}
+        apply_derived_metrics(values)
+        device_id, room = devices[device_key]
+        stamps = [(EPOCH + timedelta(milliseconds=ms)).isoformat(timespec='milliseconds')
+                  for ms in timestamps[mask].tolist()]
+        metrics = zip(*(values[name].tolist() for name in EXPORT_COLUMNS[3:]))
+        current.extend((ts, device_id, room, *row) for ts, row in zip(stamps, metrics))
+
+    if current:
+        current.sort(key=lambda row: row[0])
+        yield current
+
+
+def _hot_chunks(conn, start_time, end_time, rooms, chunk_size):
+    """Page through raw sensor_data rows with fetchmany."""
+    room_sql, room_params = _room_filter(rooms, column='s.device_key')
+    cursor = conn.execute(f'''
+        SELECT s.timestamp, d.device_id, d.room, {', '.join('s.' + m for m in EXPORT_COLUMNS[3:])}
+        FROM sensor_data s JOIN devices d ON d.device_key = s.device_key
+        WHERE datetime(s.timestamp) >= datetime(?) AND datetime(s.timestamp) <= datetime(?)
+    ''' + room_sql + " ORDER BY s.timestamp",
+        [start_time.isoformat(), end_time.isoformat()] + room_params)
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def iter_export_rows(start_time, end_time, rooms=None, db_path=DB_PATH, chunk_size=CHUNK_SIZE):
+    """Yield lists of EXPORT_COLUMNS tuples covering [start_time, end_time] for the given rooms."""
+    ensure_block_table(db_path)
+    with sqlite3.connect(db_path) as conn:
+        devices = {key: (device_id, room)
+                   for key, device_id, room in conn.execute("SELECT device_key, device_id, room FROM devices")}
+
+        # Cold rows arrive one block hour at a time, so re-chunk them to chunk_size
+        pending = []
+        for rows in _cold_chunks(conn, start_time, end_time, rooms, devices):
+            pending.extend(rows)
+            if len(pending) >= chunk_size:
+                yield pending
+                pending = []
+        if pending:
+            yield pending
+
+        yield from _hot_chunks(conn, start_time, end_time, rooms, chunk_size)
+
+
+def write_csv(chunks, file):
+    """Write row chunks to a text file object as CSV."""
+    writer = csv.writer(file)
+    writer.writerow(EXPORT_COLUMNS)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        rows += len(chunk)
+    return rows
+
+
+def write_parquet(chunks, path, row_group_size=ROW_GROUP_SIZE):
+    """Write row chunks to a Parquet file, one row group per row_group_size rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [('timestamp', pa.timestamp('us')), ('device_id', pa.string()), ('room', pa.string())] +
+        [(name, pa.float64()) for name in EXPORT_COLUMNS[3:]]
+    )
+
+    def to_batch(chunk):
+        # Columnar Arrow buffers are far smaller than the row tuples they replace
+        columns = list(zip(*chunk))
+        arrays = [pa.array(columns[0], type=pa.string()).cast(schema.field('timestamp').type)]
+        arrays += [pa.array(values, type=field.type) for values, field in zip(columns[1:], list(schema)[1:])]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    rows = 0
+    pending, pending_rows = [], 0
+    with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+        for chunk in chunks:
+            pending.append(to_batch(chunk))
+            pending_rows += len(chunk)
+            rows += len(chunk)
+            if pending_rows >= row_group_size:
+                table = pa.Table.from_batches(pending)
+                writer.write_table(table.slice(0, row_group_size))
+                pending = table.slice(row_group_size).to_batches()
+                pending_rows -= row_group_size
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema))
+    return rows
+
+
+def cleanup_exports(max_age_hours=EXPORT_RETENTION_HOURS, export_dir=EXPORT_DIR):
+    """Delete export files older than max_age_hours; returns the number removed."""
+    if not os.path.isdir(export_dir):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for entry in os.scandir(export_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:   # removed by another session meanwhile
+            pass
+    return removed
+
+
+def export_range(path, start_time, end_time, rooms=None, fmt=None, db_path=DB_PATH, chunk_size=CHUNK_SIZE):
+    """Stream a (rooms, time range) selection into `path` as CSV or Parquet.
+
+    Returns {'rows', 'seconds', 'bytes', 'rows_per_second'}.
+    """
+    fmt = fmt or ('parquet' if path.endswith('.parquet') else 'csv')
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == 'parquet' and not parquet_available():
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    chunks = iter_export_rows(start_time, end_time, rooms=rooms, db_path=db_path, chunk_size=chunk_size)
+
+    started = time.perf_counter()
+    if fmt == 'csv':
+        with open(path, 'w', newline='') as file:
+            rows = write_csv(chunks, file)
+    else:
+        rows = write_parquet(chunks, path)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'rows': rows,
+        'seconds': elapsed,
+        'bytes': os.path.getsize(path),
+        'rows_per_second': rows / max(elapsed, 1e-9),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export sensor readings to CSV or Parquet in bounded memory")
+    parser.add_argument("-o", "--output", required=True, help="output file (.csv or .parquet)")
+    parser.add_argument("--start", help="ISO timestamp (default: --days before --end)")
+    parser.add_argument("--end", default=datetime.now().isoformat(), help="ISO timestamp (default: now)")
+    parser.add_argument("--days", type=float, default=1, help="range length when --start is not given")
+    parser.add_argument("--rooms", nargs="*", help="room ids to include (default: all)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the output extension")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    end_time = datetime.fromisoformat(args.end)
+    start_time = datetime.fromisoformat(args.start) if args.start else end_time - timedelta(days=args.days)
+
+    stats = export_range(args.output, start_time, end_time, rooms=args.rooms, fmt=args.format,
+                         db_path=args.db, chunk_size=args.chunk_size)
+    print(f"✅ Exported {stats['rows']} rows to {args.output} in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_second']:,.0f} rows/s, {stats['bytes'] / 1e6:.1f} MB)")
@@ -0,0 +1,167 @@
+# background storage maintenance for the stream consumer
+#
+# The storage worker calls run_idle() whenever the queue has been empty for a moment.
+# Due tasks run in priority order until the per-gap time budget is used; anything left
+# over simply runs in a later gap, so ingest never waits long behind maintenance.
+#
+# usage (one-off, e.g. from cron while the consumer is stopped):
+#   python stream_consumer/maintenance.py
+#   python stream_consumer/maintenance.py --enable-incremental-vacuum
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from sqlite_writer import DB_PATH, ensure_db
+
+MAINTENANCE_CONFIG = {
+    "idle_seconds": 1.0,                  # empty-queue time that counts as an idle gap
+    "time_budget_seconds": 0.05,          # work per idle gap; statements past it are interrupted
+    "checkpoint_interval_seconds": 60,    # passive WAL checkpoint
+    "truncate_wal_bytes": 16 * 1024**2,   # WAL larger than this gets a truncating checkpoint
+    "optimize_interval_seconds": 3600,    # PRAGMA optimize / first ANALYZE
+    "analysis_limit": 1000,               # rows sampled per index by ANALYZE (bounds its cost)
+    "vacuum_interval_seconds": 300,       # incremental vacuum of free pages
+    "vacuum_step_pages": 256,             # pages freed per incremental_vacuum statement
+    "prune_interval_seconds": 3600,       # deletion of expired consumer_metrics rows
+    "metrics_retention_days": 7,          # consumer_metrics rows older than this are deleted
+    "retry_seconds": 5,                   # retry delay for a task that was locked out or interrupted
+}
+
+# task -> config key of its interval, in priority order
+MAINTENANCE_TASKS = {
+    "checkpoint": "checkpoint_interval_seconds",
+    "optimize": "optimize_interval_seconds",
+    "prune_metrics": "prune_interval_seconds",
+    "incremental_vacuum": "vacuum_interval_seconds",
+}
+
+
+def wal_size(db_path=DB_PATH):
+    """Current size of the database's write-ahead log in bytes (0 if there is none)."""
+    wal_path = db_path + '-wal'
+    return os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+
+class MaintenanceScheduler:
+    """Runs due WAL checkpoints, PRAGMA optimize and incremental vacuum within a time budget."""
+
+    def __init__(self, db_path=DB_PATH, config=MAINTENANCE_CONFIG):
+        self.db_path = db_path
+        self.config = config
+        self._conn = None
+        self._next_due = {task: 0.0 for task in MAINTENANCE_TASKS}   # monotonic time
+        self.last_run = None   # (datetime ISO, seconds, {task: result}) of the latest run
+
+    def _connection(self):
+        if self._conn is None:
+            ensure_db(self.db_path)
+            # No busy waiting: if the database is locked the task is retried in a later gap
+            self._conn = sqlite3.connect(self.db_path, timeout=0, isolation_level=None,
+                                         check_same_thread=False)
+        return self._conn
+
+    def run_idle(self, force=False):
+        """Run the tasks that are due (all of them with force) until the budget is used.
+
+        Returns {task: result} for the tasks that ran.
+        """
+        conn = self._connection()
+        started = time.monotonic()
+        deadline = started + self.config["time_budget_seconds"]
+        if not force:
+            # Abort any statement still running at the deadline (raises "interrupted")
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+
+        results = {}
+        try:
+            for task, interval_key in MAINTENANCE_TASKS.items():
+                now = time.monotonic()
+                if not force and (now >= deadline or now < self._next_due[task]):
+                    continue
+                try:
+                    results[task] = getattr(self, f"_{task}")(conn, None if force else deadline)
+                    self._next_due[task] = time.monotonic() + self.config[interval_key]
+                except sqlite3.OperationalError as e:   # interrupted or locked: retried shortly
+                    results[task] = f"skipped ({e})"
+                    self._next_due[task] = time.monotonic() + self.config["retry_seconds"]
+        finally:
+            conn.set_progress_handler(None, 0)
+
+        if results:
+            elapsed = time.monotonic() - started
+            self.last_run = (datetime.now().isoformat(), elapsed, results)
+            self._record_metrics(conn, {"maintenance_seconds": elapsed, "wal_size_bytes": wal_size(self.db_path)})
+        return results
+
+    def _record_metrics(self, conn, metrics):
+        """Store consumer metrics in one statement on the maintenance connection (no busy wait)."""
+        now = datetime.now().isoformat()
+        try:
+            conn.execute(
+                "INSERT INTO consumer_metrics (timestamp, name, value) VALUES " + ", ".join(["(?, ?, ?)"] * len(metrics)),
+                [field for name, value in metrics.items() for field in (now, name, value)]
+            )
+        except sqlite3.OperationalError:   # locked: these samples are skipped, the next run records again
+            pass
+
+    def _checkpoint(self, conn, deadline):
+        """Passive checkpoint; truncating once the WAL has grown past truncate_wal_bytes."""
+        mode = "TRUNCATE" if wal_size(self.db_path) > self.config["truncate_wal_bytes"] else "PASSIVE"
+        busy, wal_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return f"{mode.lower()} {checkpointed}/{wal_frames} frames" + (" (readers busy)" if busy else "")
+
+    def _optimize(self, conn, deadline):
+        """ANALYZE once if there are no statistics yet, then let PRAGMA optimize decide."""
+        conn.execute(f"PRAGMA analysis_limit = {self.config['analysis_limit']}")
+        has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        # 0x10002: consider every table, not only those queried on this connection
+        conn.execute("PRAGMA optimize(0x10002)" if has_stats else "ANALYZE")
+        return "optimize" if has_stats else "analyze"
+
+    def _prune_metrics(self, conn, deadline):
+        """Delete consumer_metrics rows past the retention window (they'd grow without bound)."""
+        cutoff = datetime.now() - timedelta(days=self.config["metrics_retention_days"])
+        deleted = conn.execute("DELETE FROM consumer_metrics WHERE timestamp < ?", (cutoff.isoformat(),)).rowcount
+        return f"{deleted} metric rows pruned"
+
+    def _incremental_vacuum(self, conn, deadline):
+        """Return free pages (e.g. left by compaction) to the OS in small steps."""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:   # 2 = INCREMENTAL
+            return "auto_vacuum is not incremental"
+
+        free_before = free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free_pages and (deadline is None or time.monotonic() < deadline):
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({self.config['vacuum_step_pages']});")
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return f"{free_before - free_pages} pages freed"
+
+
+def enable_incremental_vacuum(db_path=DB_PATH):
+    """Switch an existing database to auto_vacuum=INCREMENTAL (one full VACUUM)."""
+    ensure_db(db_path)
+    with sqlite3.connect(db_path, isolation_level=None) as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run storage maintenance on sensor_data.db once")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert a database created before incremental vacuum (rewrites the file)")
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        started = time.perf_counter()
+        enable_incremental_vacuum(args.db)
+        print(f"🧹 Enabled incremental vacuum in {time.perf_counter() - started:.2f}s")
+
+    scheduler = MaintenanceScheduler(args.db)
+    results = scheduler.run_idle(force=True)
+    for task, result in results.items():
+        print(f"🧹 {task}: {result}")
+    print(f"✅ Maintenance done in {scheduler.last_run[1]:.3f}s, WAL {wal_size(args.db) / 1024:.0f} KiB")
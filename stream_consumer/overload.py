@@ -0,0 +1,69 @@
+# adaptive load shedding for the stream consumer
+
+# Degradation levels, mildest first:
+#   sample_every  - keep every Nth reading per device for raw storage (rollups and alerts still see all)
+#   debug_output  - print every received reading
+#   batch_window  - seconds the worker waits to fill a batch (bigger = fewer commits)
+OVERLOAD_LEVELS = [
+    {"name": "normal",   "sample_every": 1,  "debug_output": True,  "batch_window": 0.2},
+    {"name": "elevated", "sample_every": 1,  "debug_output": False, "batch_window": 1.0},
+    {"name": "high",     "sample_every": 3,  "debug_output": False, "batch_window": 2.0},
+    {"name": "shedding", "sample_every": 10, "debug_output": False, "batch_window": 5.0},
+]
+
+OVERLOAD_CONFIG = {
+    "escalate_queue_depth": 500,      # backlog that moves one level up
+    "escalate_commit_seconds": 0.5,   # commit latency that moves one level up
+    "recover_queue_depth": 50,        # backlog below which a batch counts as calm
+    "recover_commit_seconds": 0.1,    # commit latency below which a batch counts as calm
+    "recover_batches": 10,            # calm batches in a row before stepping one level down
+}
+
+
+class OverloadController:
+    """Moves between OVERLOAD_LEVELS based on queue depth and commit latency."""
+
+    def __init__(self, levels=OVERLOAD_LEVELS, config=OVERLOAD_CONFIG, on_transition=None):
+        self.levels = levels
+        self.config = config
+        self.on_transition = on_transition   # called as on_transition(old_index, new_index, reason)
+        self.index = 0
+        self._calm_batches = 0
+        self._seen = {}   # device_id -> readings seen, for per-device sampling
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def update(self, queue_depth, commit_seconds):
+        """Feed the latest observations after a batch; returns the level to use next."""
+        config = self.config
+
+        if (queue_depth > config["escalate_queue_depth"]
+                or commit_seconds > config["escalate_commit_seconds"]):
+            self._calm_batches = 0
+            if self.index < len(self.levels) - 1:
+                self._move(self.index + 1, f"queue={queue_depth}, commit={commit_seconds:.3f}s")
+
+        elif (queue_depth < config["recover_queue_depth"]
+                and commit_seconds < config["recover_commit_seconds"]):
+            self._calm_batches += 1
+            if self.index > 0 and self._calm_batches >= config["recover_batches"]:
+                self._calm_batches = 0
+                self._move(self.index - 1, f"recovered after {config['recover_batches']} calm batches")
+
+        else:
+            self._calm_batches = 0
+
+        return self.level
+
+    def keep_raw(self, device_id):
+        """Whether this reading should go to raw storage at the current level."""
+        seen = self._seen.get(device_id, 0)
+        self._seen[device_id] = seen + 1
+        return seen % self.level["sample_every"] == 0
+
+    def _move(self, new_index, reason):
+        old_index, self.index = self.index, new_index
+        if self.on_transition:
+            self.on_transition(old_index, new_index, reason)
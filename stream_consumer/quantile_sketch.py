@@ -0,0 +1,137 @@
+# mergeable quantile sketch (DDSketch-style) for percentile rollups
+
+import math
+import struct
+import zlib
+
+DEFAULT_RELATIVE_ACCURACY = 0.01  # quantiles are within ±1% of the true value
+
+_HEADER = struct.Struct('<Bdddddd')  # version, alpha, count, zero_count, min, max, sum
+_VERSION = 1
+
+
+class DDSketch:
+    """Log-bucketed histogram with a relative-error guarantee.
+
+    Two sketches built with the same accuracy merge exactly by adding bucket
+    counts, so per-bucket rollups can be combined into any larger window.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}   # bucket index -> count for values > 0
+        self.negative = {}   # bucket index -> count for |values| of values < 0
+        self.zero_count = 0.0
+        self.count = 0.0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index):
+        # Midpoint of the bucket (gamma^(i-1), gamma^i] in the relative-error sense
+        return 2 * self.gamma ** index / (1 + self.gamma)
+
+    def add(self, value, count=1.0):
+        """Add a value, optionally with a weight (e.g. a held reading over several intervals)."""
+        if value > 0:
+            index = self._index(value)
+            self.positive[index] = self.positive.get(index, 0.0) + count
+        elif value < 0:
+            index = self._index(-value)
+            self.negative[index] = self.negative.get(index, 0.0) + count
+        else:
+            self.zero_count += count
+
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one."""
+        if other.count == 0:
+            return self
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        for index, count in other.positive.items():
+            self.positive[index] = self.positive.get(index, 0.0) + count
+        for index, count in other.negative.items():
+            self.negative[index] = self.negative.get(index, 0.0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Return the approximate q-quantile (0 <= q <= 1), or None for an empty sketch."""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = 0.0
+
+        # Walk from the most negative value up to the largest positive one
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return max(-self._value(index), self.min)
+
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return min(self._value(index), self.max)
+
+        return self.max
+
+    def to_bytes(self):
+        """Serialize into a compact, compressed blob."""
+        parts = [_HEADER.pack(_VERSION, self.relative_accuracy, self.count, self.zero_count,
+                              self.min, self.max, self.sum)]
+        for store in (self.positive, self.negative):
+            indexes = sorted(store)
+            parts.append(struct.pack('<I', len(indexes)))
+            parts.append(struct.pack(f'<{len(indexes)}i', *indexes))
+            parts.append(struct.pack(f'<{len(indexes)}d', *(store[i] for i in indexes)))
+        return zlib.compress(b''.join(parts))
+
+    @classmethod
+    def from_bytes(cls, blob):
+        """Rebuild a sketch serialized with to_bytes()."""
+        data = zlib.decompress(blob)
+        version, alpha, count, zero_count, min_value, max_value, total = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+
+        sketch = cls(alpha)
+        sketch.count = count
+        sketch.zero_count = zero_count
+        sketch.min = min_value
+        sketch.max = max_value
+        sketch.sum = total
+
+        offset = _HEADER.size
+        for store in (sketch.positive, sketch.negative):
+            (n,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            indexes = struct.unpack_from(f'<{n}i', data, offset)
+            offset += 4 * n
+            counts = struct.unpack_from(f'<{n}d', data, offset)
+            offset += 8 * n
+            store.update(zip(indexes, counts))
+        return sketch
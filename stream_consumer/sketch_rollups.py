@@ -0,0 +1,174 @@
+# per-room, per-time-bucket quantile rollups for real-time IoT analytics
+
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from quantile_sketch import DDSketch
+from sqlite_writer import DB_PATH
+
+SKETCH_METRICS = ['temperature', 'humidity', 'co2', 'mood_score']
+SKETCH_BUCKET_MINUTES = 5      # rollup resolution
+SKETCH_FLUSH_SECONDS = 30      # how often the open bucket is persisted for the dashboard
+
+# Step-hold for report-by-exception publishers: a silent device still holds its last value
+HOLD_INTERVAL_SECONDS = 20     # sampling period of the sensors (publisher SAMPLE_SECONDS)
+MAX_HOLD_SECONDS = 600         # longer silences are treated as outages, not held values
+
+# (room, metric, bucket_start) -> DDSketch for buckets still being filled
+_open_sketches = {}
+_dirty = set()
+_last_flush = 0.0
+
+# device_id -> (datetime, reading) of the last reading seen, for step-hold
+_last_readings = {}
+
+# databases whose sensor_sketches table exists (created on first use, not at import)
+_initialized = set()
+
+
+def init_sketch_table(db_path=DB_PATH):
+    """Create the sensor_sketches table if it doesn't exist."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sensor_sketches (
+                room TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                sketch BLOB NOT NULL,
+                PRIMARY KEY (room, metric, bucket_start)
+            )
+        ''')
+        conn.commit()
+    _initialized.add(db_path)
+
+
+def ensure_sketch_table(db_path=DB_PATH):
+    """Create the sensor_sketches table on first use in this process."""
+    if db_path not in _initialized:
+        init_sketch_table(db_path)
+
+
+def bucket_start_for(timestamp):
+    """Floor an ISO timestamp (or datetime) to the start of its rollup bucket."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    minute = timestamp.minute - timestamp.minute % SKETCH_BUCKET_MINUTES
+    return timestamp.replace(minute=minute, second=0, microsecond=0).isoformat()
+
+
+def _load_sketch(conn, room, metric, bucket_start):
+    """Resume a bucket persisted earlier (e.g. before a consumer restart)."""
+    row = conn.execute(
+        "SELECT sketch FROM sensor_sketches WHERE room = ? AND metric = ? AND bucket_start = ?",
+        (room, metric, bucket_start)
+    ).fetchone()
+    return DDSketch.from_bytes(row[0]) if row else DDSketch()
+
+
+def add_to_sketches(sensor_data, weight=1.0, db_path=DB_PATH):
+    """Add one reading to the open sketches of its room and bucket, without persisting."""
+    bucket_start = bucket_start_for(sensor_data['timestamp'])
+    room = sensor_data['room']
+
+    conn = None
+    for metric in SKETCH_METRICS:
+        value = sensor_data.get(metric)
+        if value is None:
+            continue
+
+        key = (room, metric, bucket_start)
+        sketch = _open_sketches.get(key)
+        if sketch is None:
+            if conn is None:
+                ensure_sketch_table(db_path)
+                conn = sqlite3.connect(db_path)
+            sketch = _open_sketches[key] = _load_sketch(conn, room, metric, bucket_start)
+
+        sketch.add(float(value), weight)
+        _dirty.add(key)
+
+    if conn is not None:
+        conn.close()
+
+
+def add_with_step_hold(sensor_data, db_path=DB_PATH):
+    """Add a reading, first filling the silent intervals since the device's previous reading.
+
+    With deadband publishing a gap means "unchanged", so the previous value is
+    counted once per missed sampling interval, in the bucket that interval fell in.
+    """
+    timestamp = datetime.fromisoformat(sensor_data['timestamp'])
+    previous = _last_readings.get(sensor_data['device_id'])
+    _last_readings[sensor_data['device_id']] = (timestamp, sensor_data)
+
+    if previous is not None:
+        previous_time, previous_reading = previous
+        gap = (timestamp - previous_time).total_seconds()
+        if gap <= MAX_HOLD_SECONDS:
+            step = timedelta(seconds=HOLD_INTERVAL_SECONDS)
+            held_at = previous_time + step
+            while held_at < timestamp - step / 2:
+                add_to_sketches(dict(previous_reading, timestamp=held_at.isoformat()), db_path=db_path)
+                held_at += step
+
+    add_to_sketches(sensor_data, db_path=db_path)
+
+
+def update_sketches(sensor_data, weight=1.0, db_path=DB_PATH):
+    """Add one reading to its sketches and persist them when a flush is due."""
+    add_to_sketches(sensor_data, weight, db_path)
+    flush_sketches(db_path=db_path)
+
+
+def flush_sketches(force=False, db_path=DB_PATH):
+    """Persist dirty sketches and drop buckets that have closed."""
+    global _last_flush
+
+    now = time.monotonic()
+    if not force and now - _last_flush < SKETCH_FLUSH_SECONDS:
+        return
+    _last_flush = now
+
+    if _dirty:
+        ensure_sketch_table(db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sensor_sketches (room, metric, bucket_start, sketch) VALUES (?, ?, ?, ?)",
+                [(room, metric, bucket, _open_sketches[(room, metric, bucket)].to_bytes())
+                 for room, metric, bucket in _dirty]
+            )
+            conn.commit()
+        _dirty.clear()
+
+    # Once flushed, a bucket older than the current one will not change again
+    current = bucket_start_for(datetime.now())
+    for key in [k for k in _open_sketches if k[2] < current]:
+        del _open_sketches[key]
+
+
+def query_percentiles(start_time, end_time, rooms=None, metrics=SKETCH_METRICS,
+                      quantiles=(0.5, 0.95, 0.99), db_path=DB_PATH):
+    """Merge the rollups overlapping [start_time, end_time] and return {metric: {q: value}}.
+
+    Windows are resolved to whole buckets, so the edges are accurate to SKETCH_BUCKET_MINUTES.
+    """
+    query = '''
+        SELECT metric, sketch FROM sensor_sketches
+        WHERE bucket_start >= ? AND bucket_start <= ?
+    '''
+    params = [bucket_start_for(start_time), end_time.isoformat()]
+
+    if rooms:
+        rooms = [rooms] if isinstance(rooms, str) else list(rooms)
+        query += f" AND room IN ({', '.join('?' * len(rooms))})"
+        params.extend(rooms)
+
+    merged = {metric: DDSketch() for metric in metrics}
+    ensure_sketch_table(db_path)
+    with sqlite3.connect(db_path) as conn:
+        for metric, blob in conn.execute(query, params):
+            if metric in merged:
+                merged[metric].merge(DDSketch.from_bytes(blob))
+
+    return {metric: {q: sketch.quantile(q) for q in quantiles} for metric, sketch in merged.items()}
@@ -4,48 +4,296 @@ import sqlite3
 import os
 from datetime import datetime
 
+from derived_metrics import DERIVED_METRICS, apply_derived_metrics
+
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # Get the directory of this script
 DB_PATH = os.path.join(BASE_DIR, 'storage', 'sensor_data.db') # Storage directory for date-specific files
+ALERT_DB_PATH = os.path.join(BASE_DIR, 'storage', 'alert_log.db') # Alert store shared with the dashboard
+LEGACY_ALERT_DB_PATH = os.path.join(BASE_DIR, 'dashboard', 'alert_log.db') # Dashboard-only alert store before it was shared
+
+BASE_METRICS = ['temperature', 'humidity', 'co2']
+SENSOR_COLUMNS = ['timestamp', 'device_key'] + BASE_METRICS + list(DERIVED_METRICS)
+
+# A reading is identified by its device and its timestamp to the millisecond (the cold
+# tier's precision); '.000' pads timestamps that were written without a fraction
+READING_KEY_SQL = "substr(timestamp || '.000', 1, 23)"
+
+# Readings already stored (e.g. a redelivered message or a re-run import) are skipped
+_INSERT_SQL = f'''
+    INSERT OR IGNORE INTO sensor_data ({', '.join(SENSOR_COLUMNS)})
+    VALUES ({', '.join('?' * len(SENSOR_COLUMNS))})
+'''
+
+# database file -> {device_id: device_key}, filled once per device and reused for every reading
+_device_keys = {}
+
+# databases initialized by this process; tables are created on first use, not at import
+_initialized = set()
+
+
+def room_label(room):
+    """Human-readable label for a room id, e.g. 'living_Room' -> 'Living Room'."""
+    return room.replace('_', ' ').title()
+
+
+def table_columns(conn, table):
+    """Column names of a table (empty if it doesn't exist)."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def register_devices(conn, devices):
+    """Register (device_id, room) pairs that are not in the devices table yet."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO devices (device_id, room, label) VALUES (?, ?, ?)",
+        [(device_id, room, room_label(room)) for device_id, room in devices]
+    )
+
+
+def _migrate_sensor_data(conn):
+    """Move a legacy sensor_data table (TEXT device_id/room per row) onto device keys."""
+    register_devices(conn, conn.execute("SELECT DISTINCT device_id, room FROM sensor_data").fetchall())
+
+    conn.execute('''
+        CREATE TABLE sensor_data_new (
+            timestamp TEXT,
+            device_key INTEGER REFERENCES devices(device_key),
+            temperature REAL,
+            humidity REAL,
+            co2 REAL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO sensor_data_new (timestamp, device_key, temperature, humidity, co2)
+        SELECT s.timestamp, d.device_key, s.temperature, s.humidity, s.co2
+        FROM sensor_data s JOIN devices d ON d.device_id = s.device_id
+        ORDER BY s.rowid
+    ''')
+    conn.execute("DROP TABLE sensor_data")
+    conn.execute("ALTER TABLE sensor_data_new RENAME TO sensor_data")
+
+
+def _add_derived_columns(conn):
+    """Add a REAL column for each newly registered derived metric and fill it for existing rows."""
+    missing = [name for name in DERIVED_METRICS if name not in table_columns(conn, 'sensor_data')]
+    if not missing:
+        return
+
+    for name in missing:
+        conn.execute(f"ALTER TABLE sensor_data ADD COLUMN {name} REAL")
+
+    rows = conn.execute(f"SELECT rowid, {', '.join(BASE_METRICS)} FROM sensor_data").fetchall()
+    updates = []
+    for rowid, *metrics in rows:
+        values = apply_derived_metrics(dict(zip(BASE_METRICS, metrics)))
+        updates.append([values[name] for name in missing] + [rowid])
+    conn.executemany(
+        f"UPDATE sensor_data SET {', '.join(f'{name} = ?' for name in missing)} WHERE rowid = ?",
+        updates
+    )
+
+
+def reading_key(timestamp):
+    """Python equivalent of READING_KEY_SQL for an ISO timestamp."""
+    return (timestamp + '.000')[:23]
+
+
+def _add_reading_index(conn):
+    """Unique (device, millisecond) index; exact duplicates stored before it existed are dropped."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_sensor_data_reading'").fetchone():
+        return
+    conn.execute(f'''
+        DELETE FROM sensor_data WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM sensor_data GROUP BY device_key, {READING_KEY_SQL}
+        )
+    ''')
+    conn.execute(f"CREATE UNIQUE INDEX idx_sensor_data_reading ON sensor_data (device_key, {READING_KEY_SQL})")
+
+
+def _upgrade_alert_log(conn):
+    """One-time upgrade of the shared alert store, tracked in PRAGMA user_version.
+
+    Version 1 imports the alerts the dashboard kept in dashboard/alert_log.db and
+    rewrites 'YYYY-MM-DD HH:MM:SS' timestamps (pandas to_sql) as ISO text with a 'T',
+    the format the consumer writes, so the column sorts and parses as one format.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+        return
+
+    legacy = os.path.exists(LEGACY_ALERT_DB_PATH) and \
+        os.path.abspath(LEGACY_ALERT_DB_PATH) != os.path.abspath(ALERT_DB_PATH)
+    if legacy:
+        conn.execute("ATTACH DATABASE ? AS legacy", (LEGACY_ALERT_DB_PATH,))  # not allowed inside a transaction
+        legacy = 'timestamp' in [row[1] for row in conn.execute("PRAGMA legacy.table_info(alert_log)")]
+    try:
+        # The consumer and the dashboard may both get here first; only one imports
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            if legacy:
+                conn.execute('''
+                    INSERT INTO alert_log (timestamp, room, alert_type, value)
+                    SELECT timestamp, room, alert_type, value FROM legacy.alert_log
+                    WHERE timestamp IS NOT NULL AND room IS NOT NULL
+                      AND alert_type IS NOT NULL AND value IS NOT NULL
+                ''')
+            conn.execute("UPDATE alert_log SET timestamp = replace(timestamp, ' ', 'T') WHERE timestamp LIKE '____-__-__ %'")
+            conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if conn.execute("PRAGMA database_list").fetchall()[-1][1] == 'legacy':
+            conn.execute("DETACH DATABASE legacy")
 
-#ensure the storage directory exists
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
 #create a table if it does not exist
-def init_db():
+def init_db(db_path=DB_PATH):
+
+    """Initialize the SQLite databases and create the devices, sensor_data and alert_log tables if they don't exist."""
+    #ensure the storage directory exists
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    with sqlite3.connect(db_path) as conn:
+        # WAL lets dashboard readers and the consumer work concurrently (checkpointed by
+        # maintenance.py); auto_vacuum only takes effect on a database without tables yet
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
 
-    """Initialize the SQLite database and create the sensor_data table if it doesn't exist."""
-    with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS devices (
+                device_key INTEGER PRIMARY KEY,
+                device_id TEXT NOT NULL UNIQUE,
+                room TEXT NOT NULL,
+                label TEXT NOT NULL
+            )
+        ''')
+
+        # Older databases repeat device_id and room as TEXT on every row
+        if 'device_id' in table_columns(conn, 'sensor_data'):
+            _migrate_sensor_data(conn)
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS sensor_data (
                 timestamp TEXT,
-                device_id TEXT,
-                room TEXT,
+                device_key INTEGER REFERENCES devices(device_key),
                 temperature REAL,
                 humidity REAL,
                 co2 REAL
             )
         ''')
+        _add_derived_columns(conn)
+        _add_reading_index(conn)
+        # Time-range reads (dashboard) compare the ISO text directly, so they can use it
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sensor_data_timestamp ON sensor_data (timestamp)")
+
+        # Operational metrics of the consumer (overload level transitions, ...)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS consumer_metrics (
+                timestamp TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value REAL
+            )
+        ''')
+        conn.commit()
+    conn.close()  # the context manager only commits; an idle handle would block journal mode changes
+
+    with sqlite3.connect(ALERT_DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alert_log (
+                timestamp TEXT NOT NULL,
+                room TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                value REAL NOT NULL
+            )
+        ''')
         conn.commit()
+        _upgrade_alert_log(conn)
+    conn.close()
+
+    _initialized.add(db_path)
+
+def ensure_db(db_path=DB_PATH):
+    """Run init_db once per process for db_path; cheap on every later call."""
+    if db_path not in _initialized:
+        init_db(db_path)
+
+def device_key_cache(conn):
+    """The device key cache of the database conn is attached to (keys differ between databases)."""
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not path:  # in-memory or temporary database: nothing to share the cache with
+        return {}
+    return _device_keys.setdefault(path, {})
+
+def get_device_key(conn, device_id, room, cache=None):
+    """Return the integer key for a device, registering it on first sight.
+
+    Pass device_key_cache(conn) when resolving many readings on one connection.
+    """
+    if cache is None:
+        cache = device_key_cache(conn)
+    device_key = cache.get(device_id)
+    if device_key is None:
+        register_devices(conn, [(device_id, room)])
+        device_key = conn.execute(
+            "SELECT device_key FROM devices WHERE device_id = ?", (device_id,)
+        ).fetchone()[0]
+        cache[device_id] = device_key
+    return device_key
+
+def load_device_registry(db_path=DB_PATH):
+    """Return the registered devices as [(device_key, device_id, room, label)] ordered by key."""
+    ensure_db(db_path)
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            "SELECT device_key, device_id, room, label FROM devices ORDER BY device_key"
+        ).fetchall()
+
+def _sensor_row(conn, sensor_data, cache=None):
+    """Build the sensor_data row for a reading, deriving metrics the pipeline hasn't yet."""
+    if any(name not in sensor_data for name in DERIVED_METRICS):
+        apply_derived_metrics(sensor_data)
+
+    return (
+        sensor_data['timestamp'],
+        get_device_key(conn, sensor_data['device_id'], sensor_data['room'], cache),
+        *(sensor_data.get(name) for name in SENSOR_COLUMNS[2:])   # a missing metric is stored as NULL
+    )
 
 # Function to write sensor data to the SQLite database
 def insert_sensor_data(sensor_data):
+    ensure_db()
     with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO sensor_data (timestamp, device_id, room, temperature, humidity, co2)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            sensor_data['timestamp'],
-            sensor_data['device_id'],
-            sensor_data['room'],
-            sensor_data['temperature'],
-            sensor_data['humidity'],
-            sensor_data['co2']
-        ))
+        cursor.execute(_INSERT_SQL, _sensor_row(conn, sensor_data))
         conn.commit()
 
+# Function to write many readings with one executemany (caller owns the transaction and ensure_db)
+def insert_sensor_batch(conn, readings):
+    cache = device_key_cache(conn)
+    conn.executemany(_INSERT_SQL, [_sensor_row(conn, sensor_data, cache) for sensor_data in readings])
+
+# Function to record a consumer metric sample
+def record_metric(name, value, db_path=DB_PATH):
+    ensure_db(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO consumer_metrics (timestamp, name, value) VALUES (?, ?, ?)",
+            (datetime.now().isoformat(), name, value)
+        )
+        conn.commit()
 
-# Initialize the database and create the table if it doesn't exist
-init_db()
+# Function to write (timestamp, room, alert_type, value) alerts to the alert store
+def insert_alerts(alerts):
+    if not alerts:
+        return
+
+    ensure_db()
+    with sqlite3.connect(ALERT_DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO alert_log (timestamp, room, alert_type, value)
+            VALUES (?, ?, ?, ?)
+        ''', alerts)
+        conn.commit()
@@ -1,9 +1,34 @@
 # subscriber for the real-time IoT analytics system
 
 import json
+import math
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
 import paho.mqtt.client as mqtt
 # from csv_writer import write_sensor_data_csv  # Import the CSV writer function
-from sqlite_writer import insert_sensor_data  # Import the sqlite writer function
+from sqlite_writer import DB_PATH, BASE_METRICS, ensure_db, insert_sensor_batch, insert_alerts, record_metric  # Import the sqlite writer functions
+from derived_metrics import apply_derived_metrics  # Comfort/mood score, °F, ... computed once per reading
+from anomaly_detector import detect_anomalies  # Streaming per-device anomaly detection
+from sketch_rollups import add_with_step_hold, flush_sketches  # Per-room quantile rollups for percentile KPIs
+from overload import OverloadController, OVERLOAD_LEVELS  # Adaptive load shedding under bursts
+from maintenance import MaintenanceScheduler, MAINTENANCE_CONFIG  # WAL checkpoints, optimize, vacuum in idle gaps
+
+MAX_BATCH_SIZE = 1000  # readings per commit, whatever the batch window
+
+# Received readings waiting for the storage worker
+message_queue = queue.Queue()
+
+
+# record every overload level change as a metric
+def on_overload_transition(old_index, new_index, reason):
+    old, new = OVERLOAD_LEVELS[old_index]["name"], OVERLOAD_LEVELS[new_index]["name"]
+    print(f"🚦 Overload level {old} -> {new} ({reason})")
+    record_metric("overload_level", new_index)
+
+controller = OverloadController(on_transition=on_overload_transition)
 
 
 # callback function when client connects to the broker
@@ -12,42 +37,149 @@ def on_connect(client, userdata, flags, rc):
     client.subscribe("iot/sensor/data")  # Subscribe to the topic for sensor data
 
 
+# reason a decoded message is not a storable reading, or None if it is one
+def reading_error(sensor_data):
+    if not isinstance(sensor_data, dict):
+        return "not a JSON object"
+    for field in ('timestamp', 'device_id', 'room'):
+        if not isinstance(sensor_data.get(field), str):
+            return f"missing or non-text {field}"
+    for metric in BASE_METRICS:
+        value = sensor_data.get(metric)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            return f"missing or non-finite number for {metric}"
+    try:
+        datetime.fromisoformat(sensor_data['timestamp'])
+    except ValueError:
+        return f"invalid timestamp {sensor_data['timestamp']!r}"
+    return None
+
+
 # callback function when a message is received from the broker
 def on_message(client, userdata, msg):
     try:
         payload = msg.payload.decode('utf-8')  # Decode the message payload
         sensor_data = json.loads(payload)  # Parse the JSON data
-        print(f"📥 Received message on {msg.topic}: {sensor_data}")
-        insert_sensor_data(sensor_data)  # Write the sensor data to a SQLite database
+        if controller.level["debug_output"]:
+            print(f"📥 Received message on {msg.topic}: {sensor_data}")
+
+        # Reject malformed readings here, before they reach sketches, detectors or the batch
+        error = reading_error(sensor_data)
+        if error:
+            print(f"❌ Dropping message on {msg.topic} ({error}): {payload[:200]}")
+            return
+        message_queue.put(sensor_data)  # Hand over to the storage worker; keeps the network loop responsive
 
         # write_sensor_data_csv(sensor_data)  # Write the sensor data to a CSV instead
     
-    except json.JSONDecodeError as e:
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
         print(f"❌ Error parsing message : {e}")
 
 
+# collect readings until the current level's batch window closes (empty list after an idle gap)
+def next_batch(idle_timeout=None):
+    try:
+        batch = [message_queue.get(timeout=idle_timeout)]  # Block until there is work
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + controller.level["batch_window"]
+    while len(batch) < MAX_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(message_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+# store one batch: sampled raw rows in a single transaction, every reading into rollups and alerts
+def process_batch(conn, batch):
+    raw = []
+    anomalies = []
+    for sensor_data in batch:
+        try:
+            apply_derived_metrics(sensor_data)  # Derived columns for storage and rollups
+            add_with_step_hold(sensor_data)  # Fold the reading (and any held value before it) into the sketches
+            anomalies.extend(detect_anomalies(sensor_data))  # Update the per-device EWMA baselines
+        except (KeyError, TypeError, ValueError) as e:  # Skip just this reading, keep the rest of the batch
+            print(f"❌ Skipping reading {sensor_data} : {e!r}")
+            continue
+        if controller.keep_raw(sensor_data['device_id']):
+            raw.append(sensor_data)
+
+    started = time.perf_counter()
+    insert_sensor_batch(conn, raw)  # Write the sensor data to a SQLite database
+    conn.commit()
+    commit_seconds = time.perf_counter() - started
+
+    flush_sketches()
+    if anomalies:
+        print(f"⚠️ Anomalies detected: {anomalies}")
+        insert_alerts(anomalies)  # Store anomalies alongside the threshold alerts
+
+    # Compressed cold storage pulls in NumPy, so it is imported on first use instead of at startup
+    from block_storage import compact_if_due
+    moved = compact_if_due()  # Hourly: move closed blocks past the hot window to sensor_blocks
+    if moved:
+        print(f"🧊 Compacted {moved} rows into compressed blocks")
+
+    controller.update(message_queue.qsize(), commit_seconds)
+
+
+# storage worker: drains the queue in batches on its own connection
+def storage_worker():
+    ensure_db()  # Tables are created here, off the startup path
+    conn = sqlite3.connect(DB_PATH)
+    maintenance = MaintenanceScheduler()
+    while True:
+        batch = next_batch(idle_timeout=MAINTENANCE_CONFIG["idle_seconds"])
+        if not batch:
+            # Idle gap: storage upkeep within its time budget, never while shedding load
+            if controller.index == 0:
+                try:
+                    maintenance.run_idle()
+                except sqlite3.Error as e:
+                    print(f"❌ Error during storage maintenance : {e}")
+            continue
+
+        try:
+            process_batch(conn, batch)
+        except Exception as e:  # Keep the worker alive; a bad batch must not stop ingestion
+            conn.rollback()
+            print(f"❌ Error storing batch of {len(batch)} readings : {e}")
+
+
+# callback function when the connection to the broker drops
+def on_disconnect(client, userdata, rc):
+    if rc != 0:
+        print("🚨 Disconnected from MQTT broker. Trying to reconnect...")  # loop_forever reconnects
+
+
 # MQTT broker configuration
 MQTT_BROKER = 'localhost'  # Change to your MQTT broker address
 MQTT_PORT = 1883
 
-# MQTT client setup
-client = mqtt.Client(protocol=mqtt.MQTTv311)  # Create a new MQTT client instance
-client.on_connect = on_connect  # Assign the on_connect callback
-client.on_message = on_message  # Assign the on_message callback
 
-# Connect to the MQTT broker
-client.connect(MQTT_BROKER, MQTT_PORT, 60)  # Connect to the MQTT broker
+def main():
+    # MQTT client setup
+    client = mqtt.Client(protocol=mqtt.MQTTv311)  # Create a new MQTT client instance
+    client.on_connect = on_connect  # Assign the on_connect callback
+    client.on_message = on_message  # Assign the on_message callback
+    client.on_disconnect = on_disconnect  # Assign the on_disconnect callback
+    client.reconnect_delay_set(min_delay=1, max_delay=30)  # Back off between reconnect attempts
+
+    # Connect to the MQTT broker
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)  # Connect to the MQTT broker
+
+    # Start the storage worker before messages start arriving
+    threading.Thread(target=storage_worker, daemon=True).start()
+
+    # Start the MQTT client loop to process network traffic and dispatch callbacks
+    client.loop_forever()  # Keep the client running to listen for messages
+    # Note: Make sure the MQTT broker is running and the publisher is sending data to the same topic.
 
-# Start the MQTT client loop to process network traffic and dispatch callbacks
-client.loop_forever()  # Keep the client running to listen for messages
-# Note: Make sure the MQTT broker is running and the publisher is sending data to the same topic.
-def on_disconnect(client, userdata, rc):
-    print("🚨 Disconnected from MQTT broker. Trying to reconnect...")
-    while rc != 0:
-        time.sleep(5)
-        try:
-            rc = client.reconnect()
-        except:
-            pass
 
-client.on_disconnect = on_disconnect
+if __name__ == "__main__":
+    main()